@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import Member, Staff
+
+# Write-behind tracker for Staff/Member.last_activity.
+#
+# Requests only record a timestamp in memory (keyed by user id). The buffer
+# is written back with one bulk_update per profile model once it grows past
+# ACTIVITY_FLUSH_SIZE entries or ACTIVITY_FLUSH_INTERVAL seconds have passed,
+# and a user is not buffered again until ACTIVITY_GRANULARITY seconds after
+# their last recorded timestamp. The interval is checked on every request and
+# by a timer started when the buffer goes from empty to non-empty, so a quiet
+# worker still writes back within one interval. Anything still buffered when
+# the process exits is dropped, which costs at most one flush interval of
+# activity.
+
+
+class ActivityTracker:
+    def __init__(self, granularity=None, flush_interval=None, flush_size=None):
+        self.granularity = timedelta(seconds=granularity if granularity is not None
+                                     else getattr(settings, 'ACTIVITY_GRANULARITY', 60))
+        self.flush_interval = (flush_interval if flush_interval is not None
+                               else getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 30))
+        self.flush_size = (flush_size if flush_size is not None
+                           else getattr(settings, 'ACTIVITY_FLUSH_SIZE', 100))
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._seen = {}
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    def touch(self, user_id, now=None):
+        if self.record(user_id, now):
+            self.flush()
+
+    def record(self, user_id, now=None):
+        # The in-memory half of touch(): returns True when a flush is due,
+        # for callers (async middleware) that run the flush elsewhere.
+        now = now or timezone.now()
+
+        with self._lock:
+            seen = self._seen.get(user_id)
+            if seen is None or now - seen >= self.granularity:
+                self._seen[user_id] = now
+                self._pending[user_id] = now
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+            return (len(self._pending) >= self.flush_size or
+                    time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            # Forget users whose timestamp is already older than the granularity
+            # so the coalescing map does not grow with every user ever seen.
+            cutoff = timezone.now() - self.granularity
+            self._seen = {uid: ts for uid, ts in self._seen.items() if ts > cutoff}
+
+        if not pending:
+            return 0
+
+        written = 0
+        try:
+            for model in (Staff, Member):
+                profiles = list(model.objects.filter(user_id__in=pending).only('id', 'user_id'))
+                for profile in profiles:
+                    profile.last_activity = pending[profile.user_id]
+                if profiles:
+                    model.objects.bulk_update(profiles, ['last_activity'])
+                    written += len(profiles)
+        except DatabaseError:
+            # Activity timestamps are best effort; never fail a request for them.
+            pass
+        return written
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own connection
+            connections.close_all()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+
+tracker = ActivityTracker()
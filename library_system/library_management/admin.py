@@ -1,12 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 
-from .models import Book,BorrowRecord,Staff,Member
+from .models import Book,BookCopy,BorrowRecord,ArchivedBorrowRecord,Hold,Staff,Member
 
 # Register your models here.
 
 
 admin.site.register(Book)
+admin.site.register(BookCopy)
 admin.site.register(BorrowRecord)
+admin.site.register(ArchivedBorrowRecord)
 admin.site.register(Staff)
 admin.site.register(Member)
+admin.site.register(Hold)
@@ -0,0 +1,154 @@
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .catalog import filter_books, parse_filters
+from .fines import compute_fine
+from .models import ArchivedBorrowRecord, Book, BorrowRecord
+from .pagination import InvalidCursor, paginate, paginate_union
+from .profiles import get_profile, role_of
+
+# Read-only JSON API (v1) for the kiosks and the mobile app, routed under
+# /api/v1/. Lists are keyset-paginated like the HTML pages and read with
+# .values() restricted to the requested fields, so no model instances are
+# built and no template is rendered. Responses look like
+#
+#     {"items": [{"id": 1, "Title": "..."}, ...], "next": "<cursor or null>"}
+#
+# ?fields=Title,Author picks the fields (id is always included), ?limit= the
+# page size and ?cursor= continues from the "next" of the previous page.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+BOOK_FIELDS = ['id', 'Title', 'Author', 'ISBN', 'Genre', 'Published_date', 'Price', 'Pages', 'Status',
+               'copies_total', 'copies_available', 'Image', 'Added_on', 'Updated_on']
+BOOK_ORDERINGS = {
+    'newest': ['-Added_on', '-id'],
+    'oldest': ['Added_on', 'id'],
+}
+
+# name in the API: ORM lookup
+LOAN_FIELDS = {
+    'id': 'id',
+    'book_id': 'book_id',
+    'title': 'book__Title',
+    'author': 'book__Author',
+    'borrow_date': 'borrow_date',
+    'due_date': 'due_date',
+    'return_date': 'return_date',
+    'is_returned': 'is_returned',
+    'is_overdue': 'is_overdue',
+    'fine': 'fine',
+}
+LOAN_ORDERING = ['-borrow_date', '-id']
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _json(data):
+    return JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+
+
+def api_view(view):
+    """GET only, session login required; answers with JSON errors instead of redirects."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required.', 401)
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as e:
+            return _error(str(e), 400)
+        except InvalidCursor:
+            return _error('Invalid cursor.', 400)
+    return wrapper
+
+
+def _fields(params, available):
+    if not params.get('fields'):
+        return list(available)
+    fields = ['id']
+    for name in params['fields'].split(','):
+        name = name.strip()
+        if name not in available:
+            raise BadRequest(f'Unknown field: {name}')
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def _limit(params):
+    try:
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit must be a number.')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f'limit must be between 1 and {MAX_LIMIT}.')
+    return limit
+
+
+@api_view
+def books(request):
+    params = request.GET
+    fields = _fields(params, BOOK_FIELDS)
+    ordering = BOOK_ORDERINGS.get(params.get('order'), BOOK_ORDERINGS['newest'])
+
+    queryset = filter_books(Book.objects.all(), parse_filters(params))
+    if params.get('status') in dict(Book.STATUS_CHOICE):
+        queryset = queryset.filter(Status=params['status'])
+    # The ordering columns are read too, the cursor is built from them
+    columns = list(dict.fromkeys(fields + [name.lstrip('-') for name in ordering]))
+    page = paginate(queryset.values(*columns), ordering, params.get('cursor'), _limit(params))
+
+    items = [{name: row[name] for name in fields} for row in page]
+    if 'Image' in fields:
+        for item in items:
+            item['Image'] = settings.MEDIA_URL + item['Image'] if item['Image'] else None
+    return _json({'items': items, 'next': page.next_cursor})
+
+
+@api_view
+def my_loans(request):
+    member = get_profile(request)
+    if role_of(member) != 'member':
+        return _error('Only members have loans.', 403)
+    params = request.GET
+    fields = _fields(params, LOAN_FIELDS)
+
+    # Live and archived loans, the archive only holds returned ones
+    querysets = [BorrowRecord.objects.filter(borrower=member), ArchivedBorrowRecord.objects.filter(borrower=member)]
+    if params.get('state') == 'open':
+        querysets = [querysets[0].filter(return_date__isnull=True)]
+    elif params.get('state') == 'returned':
+        querysets = [queryset.filter(return_date__isnull=False) for queryset in querysets]
+
+    needed = set(fields) | {name.lstrip('-') for name in LOAN_ORDERING}
+    # Fines of open loans are computed as of today, like on my_books
+    live_fines = bool(needed & {'fine', 'is_overdue'})
+    if live_fines:
+        needed |= {'due_date', 'return_date'}
+    columns = {name: F(lookup) for name, lookup in LOAN_FIELDS.items() if name in needed and name != lookup}
+    names = sorted(name for name in needed if LOAN_FIELDS[name] == name)
+    rows = [queryset.values(*names, **columns) for queryset in querysets]
+
+    page = paginate_union(rows, LOAN_ORDERING, params.get('cursor'), _limit(params))
+    today = date.today()
+    items = []
+    for row in page:
+        if live_fines and row['return_date'] is None:
+            row['fine'] = compute_fine(row['due_date'], today)
+            row['is_overdue'] = row['fine'] > 0
+        items.append({name: row[name] for name in fields})
+    return _json({'items': items, 'next': page.next_cursor})
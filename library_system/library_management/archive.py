@@ -0,0 +1,76 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ArchivedBorrowRecord, Book, BorrowRecord
+from .pagination import paginate_union
+
+# Hot/cold split of the loans. Returned loans older than
+# settings.ARCHIVE_LOANS_AFTER_DAYS are moved from BorrowRecord to
+# ArchivedBorrowRecord by `manage.py archive_loans`, keeping their ids, so
+# BorrowRecord only holds open and recent loans and its pages stay in the
+# page cache. Circulation only ever touches open loans; the pages showing a
+# member's whole history read both tables with one UNION ALL query.
+
+HISTORY_ORDERING = ['-borrow_date', '-id']
+COLUMNS = [field.attname for field in BorrowRecord._meta.concrete_fields]
+
+
+def member_loans(member, **filters):
+    """values() querysets of `member`'s live and archived loans."""
+    return [model.objects.filter(borrower=member, **filters).values(*COLUMNS)
+            for model in (BorrowRecord, ArchivedBorrowRecord)]
+
+
+def history_page(member, cursor=None, per_page=50):
+    """One keyset Page of `member`'s loans, newest first, as BorrowRecords.
+
+    Raises InvalidCursor.
+    """
+    page = paginate_union(member_loans(member), HISTORY_ORDERING, cursor, per_page)
+    page.items = as_records(page.items)
+    return page
+
+
+def all_loans(member, ordering, **filters):
+    hot, cold = member_loans(member, **filters)
+    return as_records(list(hot.union(cold, all=True).order_by(*ordering)))
+
+
+def as_records(rows):
+    # Unsaved BorrowRecords so the templates do not care which table a row
+    # came from; the books are read in one query instead of a join per table
+    books = Book.objects.in_bulk({row['book_id'] for row in rows})
+    records = []
+    for row in rows:
+        record = BorrowRecord(**row)
+        record.book = books[row['book_id']]
+        records.append(record)
+    return records
+
+
+def archive_loans(before=None, chunk_size=1000, pause=0):
+    """Move loans returned before `before` to the archive, `chunk_size` per
+    transaction, sleeping `pause` seconds in between so other writers get
+    the database. Returns the number moved."""
+    before = before or date.today() - timedelta(days=settings.ARCHIVE_LOANS_AFTER_DAYS)
+    # Walks the primary key from where the last chunk ended, so the whole
+    # table is read once without an index on return_date
+    returned = BorrowRecord.objects.filter(return_date__lt=before).order_by('id').values(*COLUMNS)
+    moved = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(returned.filter(id__gt=last_id)[:chunk_size])
+            if not rows:
+                return moved
+            ArchivedBorrowRecord.objects.bulk_create([ArchivedBorrowRecord(**row) for row in rows])
+            BorrowRecord.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+        last_id = rows[-1]['id']
+        if len(rows) < chunk_size:
+            return moved
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import redirect, render
+
+from . import stats as library_stats
+from .archive import history_page
+from .catalog import acatalog_context
+from .conditional import books_state, conditional, loans_state
+from .fines import compute_fine
+from .models import Book, BorrowRecord
+from .pagination import InvalidCursor
+from .profiles import login_required, member_required, staff_required
+
+# Async twins of the read-heavy pages in views.py, routed only when the site
+# is served through asgi.py (see library_system/asgi_urls.py). They produce
+# the same context as the sync views; independent queries are started
+# together with asyncio.gather. Templates are rendered in a worker thread
+# because the auth and messages context processors still hit the database
+# lazily.
+
+arender = sync_to_async(render)
+
+
+@login_required
+@conditional(books_state)
+async def available_books(request):
+    try:
+        context = await acatalog_context(Book.objects.filter(Status='available'), request.GET)
+    except InvalidCursor:
+        return redirect('/available_books/')
+    return await arender(request, 'available_books.html', context)
+
+
+@login_required
+async def user(request):
+    if request.role == 'staff':
+        return redirect('/staff_dashboard/')
+
+    context = {
+        'user': request.profile.user if request.profile else request.user,
+        'borrowed_books_count': 0,
+        'returned_books_count': 0,
+        'total_fines': 0,
+        'recent_books': []
+    }
+
+    if request.role == 'member':
+        stats, recent_books = await asyncio.gather(
+            request.profile.aloan_stats(),
+            _alist(Book.objects.order_by('-Added_on')[:4]),
+        )
+        context['borrowed_books_count'] = stats['open']
+        context['returned_books_count'] = stats['returned']
+        context['total_fines'] = stats['total_fines']
+        context['recent_books'] = recent_books
+
+    return await arender(request, 'homepage.html', context)
+
+
+@staff_required
+async def staff_dashboard(request):
+    stats = await library_stats.acurrent()
+    context = {
+        'total_books': stats.total_books,
+        'total_members': stats.total_members,
+        'active_loans': stats.active_loans,
+        'overdue_books': stats.overdue_loans,
+    }
+    return await arender(request, 'staff_dashboard.html', context)
+
+
+@member_required
+@conditional(books_state, loans_state)
+async def borrowed_books(request):
+    member = request.profile
+    records, stats = await asyncio.gather(
+        _alist(BorrowRecord.objects.filter(borrower=member).select_related('book').order_by('-borrow_date')),
+        member.aloan_stats(),
+    )
+
+    active_loans = []
+    history = []
+    today = date.today()
+    for record in records:
+        if record.return_date is None:
+            record.fine = compute_fine(record.due_date, today)
+            record.is_overdue = record.fine > 0
+            active_loans.append(record)
+        else:
+            history.append(record)
+
+    context = {
+        'active_loans': active_loans,
+        'history': history,
+        'returned_count': stats['returned'],
+        'average_days': round(stats['average_days'], 1),
+    }
+    return await arender(request, 'borrowed_books.html', context)
+
+
+@member_required
+@conditional(books_state, loans_state)
+async def member_history(request):
+    member = request.profile
+    try:
+        history, stats = await asyncio.gather(
+            sync_to_async(history_page)(member, request.GET.get('cursor')),
+            member.aloan_stats(),
+        )
+    except InvalidCursor:
+        return redirect('/history/')
+    context = {
+        'history': history,
+        'page': history,
+        'total_records': stats['open'] + stats['returned'],
+        'total_fines': stats['total_fines'],
+        'returned_count': stats['returned']
+    }
+    return await arender(request, 'member_history.html', context)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
@@ -0,0 +1,29 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connections
+
+# Helpers shared by the bench_* management commands. Benchmarks never touch
+# the configured database: they run against a throwaway, fully migrated copy
+# created the same way the test runner creates its test database. SQLite
+# benchmarks use an on-disk file so several threads can share it.
+
+
+@contextmanager
+def benchmark_database(alias='default'):
+    connection = connections[alias]
+    old_name = connection.settings_dict['NAME']
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='library-bench-')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+from datetime import date
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .models import Book
+from .pagination import paginate
+
+# Server-side filtering and sorting for the book listings. The sort keys are
+# the values the sortFilter <select> already uses; every ordering ends in id
+# so it is unique and can be used as a keyset cursor.
+
+BOOKS_PER_PAGE = 24
+# The "N books" total is counted once per filter set and reused by the
+# following pages for this long, so paging does not count every match again
+COUNT_TIMEOUT = 60
+
+SORTS = {
+    'newest': ['-Added_on', '-id'],
+    'oldest': ['Added_on', 'id'],
+    'title-asc': ['Title', 'id'],
+    'title-desc': ['-Title', '-id'],
+    'author-asc': ['Author', 'id'],
+    'price-low': ['Price', 'id'],
+    'price-high': ['-Price', '-id'],
+    'published-new': ['-Published_date', '-id'],
+    'published-old': ['Published_date', 'id'],
+}
+DEFAULT_SORT = 'newest'
+
+
+def parse_filters(params):
+    filters = {}
+
+    genre = params.get('genre', '')
+    if genre in dict(Book.Genre_CHOICE):
+        filters['genre'] = genre
+
+    for key in ('title', 'author'):
+        value = params.get(key, '').strip()
+        if value:
+            filters[key] = value
+
+    for key in ('price_min', 'price_max'):
+        try:
+            filters[key] = int(params[key])
+        except (KeyError, ValueError):
+            pass
+
+    for key in ('published_from', 'published_to'):
+        try:
+            filters[key] = date.fromisoformat(params[key])
+        except (KeyError, ValueError):
+            pass
+
+    return filters
+
+
+def filter_books(queryset, filters):
+    if 'genre' in filters:
+        queryset = queryset.filter(Genre=filters['genre'])
+    if 'title' in filters:
+        queryset = queryset.filter(Title__istartswith=filters['title'])
+    if 'author' in filters:
+        queryset = queryset.filter(Author__iexact=filters['author'])
+    if 'price_min' in filters:
+        queryset = queryset.filter(Price__gte=filters['price_min'])
+    if 'price_max' in filters:
+        queryset = queryset.filter(Price__lte=filters['price_max'])
+    if 'published_from' in filters:
+        queryset = queryset.filter(Published_date__gte=filters['published_from'])
+    if 'published_to' in filters:
+        queryset = queryset.filter(Published_date__lte=filters['published_to'])
+    return queryset
+
+
+def _prepare(queryset, params):
+    filters = parse_filters(params)
+    sort = params.get('sort') if params.get('sort') in SORTS else DEFAULT_SORT
+    return filter_books(queryset, filters), filters, sort
+
+
+def _count_key(queryset):
+    return 'catalog_count:' + hashlib.sha1(str(queryset.query).encode()).hexdigest()
+
+
+def count_books(queryset):
+    key = _count_key(queryset)
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, COUNT_TIMEOUT)
+    return total
+
+
+async def acount_books(queryset):
+    key = _count_key(queryset)
+    total = await cache.aget(key)
+    if total is None:
+        total = await queryset.acount()
+        await cache.aset(key, total, COUNT_TIMEOUT)
+    return total
+
+
+def _context(page, total, filters, sort):
+    # Query string that carries the current filters into the pagination links
+    query = dict(filters, sort=sort)
+    return {
+        'books': page,
+        'page': page,
+        'total': total,
+        'filters': filters,
+        'sort': sort,
+        'sorts': SORTS,
+        'genres': Book.Genre_CHOICE,
+        'querystring': urlencode(query),
+    }
+
+
+def catalog_context(queryset, params, per_page=BOOKS_PER_PAGE):
+    """Filter, sort and paginate `queryset` from request.GET.
+
+    Raises pagination.InvalidCursor for a tampered or stale cursor.
+    """
+    queryset, filters, sort = _prepare(queryset, params)
+    page = paginate(queryset, SORTS[sort], params.get('cursor'), per_page)
+    return _context(page, count_books(queryset), filters, sort)
+
+
+async def acatalog_context(queryset, params, per_page=BOOKS_PER_PAGE):
+    """Async catalog_context: the page and the total count are queried concurrently."""
+    queryset, filters, sort = _prepare(queryset, params)
+    page, total = await asyncio.gather(
+        sync_to_async(paginate)(queryset, SORTS[sort], params.get('cursor'), per_page),
+        acount_books(queryset),
+    )
+    return _context(page, total, filters, sort)
@@ -0,0 +1,271 @@
+from datetime import date, timedelta
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Case, F, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .fines import LOAN_DAYS, compute_fine
+from .models import Book, BookCopy, BorrowRecord, Hold
+
+# Checkout and return as single transactions. A title owns copies_total
+# copies, copies_available of them on the shelf. A copy is claimed with a
+# conditional UPDATE (... SET copies_available = copies_available - 1 WHERE
+# copies_available > 0), so when members race for the last copy exactly one
+# UPDATE matches and the others get BookUnavailable instead of an extra loan.
+# Status is flipped in the same UPDATE, it stays 'available' while any copy is.
+#
+# Members queue for titles with no copy left with a Hold. A returned copy goes
+# to the head of the queue in the same transaction as the return: it is not
+# put back on the shelf but set aside for that member for HOLD_PICKUP_DAYS,
+# after which `manage.py expire_holds` passes it on.
+
+HOLD_PICKUP_DAYS = 3
+
+
+class CirculationError(Exception):
+    pass
+
+
+class BookUnavailable(CirculationError):
+    pass
+
+
+class LoanNotFound(CirculationError):
+    pass
+
+
+class CirculationBusy(CirculationError):
+    # The database stayed locked by other writers for longer than its timeout
+    pass
+
+
+class BookAvailable(CirculationError):
+    # Nothing to queue for, the book can be borrowed right away
+    pass
+
+
+class AlreadyOnHold(CirculationError):
+    pass
+
+
+class HoldNotFound(CirculationError):
+    pass
+
+
+class AlreadyBorrowed(CirculationError):
+    # One copy of a title per member
+    pass
+
+
+class NotEnoughCopies(CirculationError):
+    # Only copies on the shelf can be withdrawn, and a title keeps at least one
+    pass
+
+
+def checkout(book_id, member, today=None):
+    """Lend book `book_id` to `member` and return the new BorrowRecord.
+
+    Takes the copy set aside for `member` by a ready hold, or else one from
+    the shelf. Raises Book.DoesNotExist, BookUnavailable, AlreadyBorrowed or
+    CirculationBusy.
+    """
+    today = today or date.today()
+    try:
+        with transaction.atomic():
+            claimed = (Hold.objects.filter(book_id=book_id, member=member, status='ready')
+                       .update(status='fulfilled'))
+            if not claimed:
+                claimed = (Book.objects.filter(id=book_id, copies_available__gt=0)
+                           .update(copies_available=F('copies_available') - 1,
+                                   Status=Case(When(copies_available=1, then=Value('unavailable')),
+                                               default=Value('available')),
+                                   Updated_on=timezone.now()))
+            if not claimed:
+                if not Book.objects.filter(id=book_id).exists():
+                    raise Book.DoesNotExist
+                raise BookUnavailable(book_id)
+            if BorrowRecord.objects.filter(book_id=book_id, borrower=member, is_returned=False).exists():
+                raise AlreadyBorrowed(book_id)
+
+            return BorrowRecord.objects.create(
+                book_id=book_id,
+                borrower=member,
+                borrow_date=today,
+                due_date=today + timedelta(days=LOAN_DAYS),
+            )
+    except OperationalError as e:
+        raise CirculationBusy(str(e)) from e
+
+
+def checkin(book_id, member, today=None):
+    """Close `member`'s open loan of book `book_id` and return the record.
+
+    Raises LoanNotFound or CirculationBusy.
+    """
+    today = today or date.today()
+    try:
+        with transaction.atomic():
+            # Write first: on SQLite a transaction that reads and then writes
+            # can deadlock against another writer, one that starts with the
+            # UPDATE just queues for the write lock.
+            _release(book_id, today)
+
+            record = (BorrowRecord.objects.filter(book_id=book_id, borrower=member, is_returned=False)
+                      .select_related('book').first())
+            if record is None:
+                raise LoanNotFound(book_id)
+
+            record.return_date = today
+            record.is_returned = True
+            record.fine = compute_fine(record.due_date, today)
+            record.is_overdue = record.fine > 0
+            record.borrow_duration = today - record.borrow_date
+            record.save(update_fields=['return_date', 'is_returned', 'fine', 'is_overdue', 'borrow_duration',
+                                        'Updated_on'])
+            return record
+    except OperationalError as e:
+        raise CirculationBusy(str(e)) from e
+
+
+def _release(book_id, today):
+    """Give a returned copy to the head of the queue, or put it back on the
+    shelf if nobody is waiting. Must run inside a transaction."""
+    # One UPDATE; the subquery finds the head on hold_queue_idx
+    head = Hold.objects.filter(book_id=book_id, status='waiting').order_by('position').values('id')[:1]
+    assigned = (Hold.objects.filter(id=Subquery(head))
+                .update(status='ready', expires_on=today + timedelta(days=HOLD_PICKUP_DAYS)))
+    if not assigned:
+        (Book.objects.filter(id=book_id)
+         .update(copies_available=F('copies_available') + 1, Status='available', Updated_on=timezone.now()))
+    return bool(assigned)
+
+
+def place_hold(book_id, member):
+    """Queue `member` for book `book_id` and return the Hold.
+
+    Raises Book.DoesNotExist, BookAvailable, AlreadyOnHold or CirculationBusy.
+    """
+    last = Hold.objects.filter(book_id=book_id).order_by('-position').values('position')[:1]
+    try:
+        with transaction.atomic():
+            # The position is computed by the INSERT itself, so members
+            # queuing at the same moment cannot be given the same one
+            hold = Hold.objects.create(book_id=book_id, member=member,
+                                       position=Coalesce(Subquery(last), Value(0)) + 1)
+            status = Book.objects.filter(id=book_id).values_list('Status', flat=True).first()
+            if status is None:
+                raise Book.DoesNotExist
+            if status == 'available':
+                raise BookAvailable(book_id)
+            if BorrowRecord.objects.filter(book_id=book_id, borrower=member, is_returned=False).exists():
+                # Already has it; same answer as queuing twice
+                raise AlreadyOnHold(book_id)
+    except IntegrityError as e:
+        if Hold.objects.filter(book_id=book_id, member=member, status__in=Hold.ACTIVE).exists():
+            # hold_one_active_per_member
+            raise AlreadyOnHold(book_id) from e
+        if not Book.objects.filter(id=book_id).exists():
+            raise Book.DoesNotExist from e
+        # hold_book_position_uniq: another member was given the same place
+        # in the queue at the same moment
+        raise CirculationBusy(str(e)) from e
+    except OperationalError as e:
+        raise CirculationBusy(str(e)) from e
+    hold.refresh_from_db(fields=['position'])
+    return hold
+
+
+def cancel_hold(hold_id, member, today=None):
+    """Cancel one of `member`'s active holds. A book that was already set
+    aside goes on to the next member in line.
+
+    Raises HoldNotFound or CirculationBusy.
+    """
+    today = today or date.today()
+    try:
+        with transaction.atomic():
+            if Hold.objects.filter(id=hold_id, member=member, status='waiting').update(status='cancelled'):
+                return
+            if not Hold.objects.filter(id=hold_id, member=member, status='ready').update(status='cancelled'):
+                raise HoldNotFound(hold_id)
+            _release(Hold.objects.values_list('book_id', flat=True).get(id=hold_id), today)
+    except OperationalError as e:
+        raise CirculationBusy(str(e)) from e
+
+
+def expire_holds(today=None, chunk_size=500):
+    """Expire ready holds past their pickup date and pass each book on.
+    Works in chunks of `chunk_size` holds, one transaction each, so the
+    write lock is only held briefly. Returns the number expired."""
+    today = today or date.today()
+    overdue = Hold.objects.filter(status='ready', expires_on__lt=today).order_by('expires_on')
+    expired = 0
+    while True:
+        with transaction.atomic():
+            rows = list(overdue.values_list('id', 'book_id')[:chunk_size])
+            if not rows:
+                return expired
+            expired += Hold.objects.filter(id__in=[hold_id for hold_id, _ in rows]).update(status='expired')
+            for _, book_id in rows:
+                _release(book_id, today)
+        if len(rows) < chunk_size:
+            return expired
+
+
+def new_copies(book, count, numbered=None):
+    """Unsaved BookCopy rows for `count` more copies of `book`, which has
+    `numbered` copies already (counted if not given). The first copy is
+    barcoded with the ISBN, later ones with ISBN-2, ISBN-3 and so on.
+
+    Barcodes already in use are skipped: titles folded together by migration
+    0030 kept the ISBNs of their old rows as barcodes, so a new book can
+    carry an ISBN that is already a barcode of another title.
+    """
+    if numbered is None:
+        numbered = BookCopy.objects.filter(book=book).count()
+    barcodes = []
+    while len(barcodes) < count:
+        candidates = [book.ISBN if n == 1 else f'{book.ISBN}-{n}'
+                      for n in range(numbered + 1, numbered + count - len(barcodes) + 1)]
+        numbered += len(candidates)
+        taken = set(BookCopy.objects.filter(barcode__in=candidates).values_list('barcode', flat=True))
+        barcodes.extend(barcode for barcode in candidates if barcode not in taken)
+    return [BookCopy(book=book, barcode=barcode) for barcode in barcodes]
+
+
+def add_copies(book, count, today=None):
+    """Add `count` copies of `book`; they go to waiting holds first.
+
+    Raises CirculationBusy.
+    """
+    today = today or date.today()
+    try:
+        with transaction.atomic():
+            Book.objects.filter(id=book.id).update(copies_total=F('copies_total') + count, Updated_on=timezone.now())
+            BookCopy.objects.bulk_create(new_copies(book, count))
+            for _ in range(count):
+                _release(book.id, today)
+    except OperationalError as e:
+        raise CirculationBusy(str(e)) from e
+
+
+def withdraw_copies(book, count):
+    """Remove `count` copies of `book` from the shelf, newest first.
+
+    Raises NotEnoughCopies or CirculationBusy.
+    """
+    try:
+        with transaction.atomic():
+            withdrawn = (Book.objects.filter(id=book.id, copies_available__gte=count, copies_total__gt=count)
+                         .update(copies_total=F('copies_total') - count,
+                                 copies_available=F('copies_available') - count,
+                                 Status=Case(When(copies_available=count, then=Value('unavailable')),
+                                             default=Value('available')),
+                                 Updated_on=timezone.now()))
+            if not withdrawn:
+                raise NotEnoughCopies(book.id)
+            newest = BookCopy.objects.filter(book=book).order_by('-id').values_list('id', flat=True)[:count]
+            BookCopy.objects.filter(id__in=list(newest)).delete()
+    except OperationalError as e:
+        raise CirculationBusy(str(e)) from e
@@ -0,0 +1,99 @@
+import hashlib
+from datetime import date, datetime, time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Book, BorrowRecord, LibraryStats
+from .stats import STATS_ID
+
+# Conditional GET for pages members reload all the time. A page's validators
+# are built from a few indexed aggregates (see the `*_state` sources below)
+# instead of the page itself, so an unchanged page is answered with
+# 304 Not Modified before the view runs any of its queries or renders.
+#
+# Each source returns (count, latest change). The count catches deletes,
+# which do not move MAX(Updated_on). For the whole catalog it is the
+# signal-maintained LibraryStats.total_books (see stats.py): a COUNT next to
+# the MAX would make SQLite scan the whole Updated_on index instead of
+# seeking to its last entry. The ETag also covers what the page
+# shows besides the data: the user, today's date (fines and due dates) and
+# the CSRF secret of the forms on it.
+
+
+def books_state(request):
+    count = LibraryStats.objects.filter(pk=STATS_ID).values_list('total_books', flat=True).first()
+    return count, Book.objects.aggregate(changed=Max('Updated_on'))['changed']
+
+
+def loans_state(request):
+    state = (BorrowRecord.objects.filter(borrower=request.profile)
+             .aggregate(count=Count('id'), changed=Max('Updated_on')))
+    return state['count'], state['changed']
+
+
+def validators(request, sources):
+    """(etag, last_modified timestamp) of the page, or (None, None) if it
+    must not be served from a cache."""
+    # A pending message is only shown by a full render
+    if len(messages.get_messages(request)):
+        return None, None
+
+    today = date.today()
+    changed = [timezone.make_aware(datetime.combine(today, time.min))]
+    key = [request.user.pk, request.user.first_name, request.META.get('CSRF_COOKIE'), today]
+    for source in sources:
+        count, latest = source(request)
+        key += [count, latest]
+        if latest is not None:
+            changed.append(latest)
+    etag = quote_etag(hashlib.sha1(repr(key).encode()).hexdigest())
+    return etag, int(max(changed).timestamp())
+
+
+def conditional(*sources):
+    """Answer GET/HEAD with 304 while none of `sources` changed.
+
+    Goes inside login_required/member_required, the sources use
+    request.user and request.profile.
+    """
+    def check(request):
+        if request.method not in ('GET', 'HEAD'):
+            return None, None, None
+        etag, last_modified = validators(request, sources)
+        if etag is None:
+            return None, None, None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+    def finish(response, etag, last_modified):
+        if etag is not None and response.status_code in (200, 304):
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+            # Cached per user, and always revalidated
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, etag, last_modified = await sync_to_async(check)(request)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return finish(response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, etag, last_modified = check(request)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return finish(response, etag, last_modified)
+        return wrapper
+    return decorator
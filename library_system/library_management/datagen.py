@@ -0,0 +1,160 @@
+import itertools
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import search, stats
+from .fines import LOAN_DAYS, compute_fine
+from .models import Book, BookCopy, BorrowRecord, Member, Staff
+
+# Deterministic synthetic library for benchmarks: the same seed and sizes
+# always produce the same rows. Everything goes through bulk_create, so the
+# search index and dashboard stats are rebuilt at the end instead of by signals.
+
+PASSWORD = 'bench-password'
+
+# Rough share of the catalog per genre
+GENRE_WEIGHTS = {
+    'fiction': 24, 'mystery': 12, 'romance': 11, 'thriller': 10, 'nonfiction': 10,
+    'youngadult': 8, 'children': 8, 'biography': 6, 'history': 6, 'selfhelp': 5,
+}
+
+_ADJECTIVES = ['Silent', 'Hidden', 'Last', 'Broken', 'Golden', 'Lost', 'Midnight', 'Burning',
+               'Quiet', 'Secret', 'Wild', 'Forgotten', 'Distant', 'Bright', 'Crimson', 'Endless']
+_NOUNS = ['River', 'Garden', 'Kingdom', 'Letter', 'Shadow', 'Promise', 'Island', 'Winter',
+          'Library', 'Journey', 'Mirror', 'Harbor', 'Orchard', 'Signal', 'Station', 'Tide']
+_FIRST_NAMES = ['Ayesha', 'Omar', 'Sara', 'Bilal', 'Hina', 'Usman', 'Maria', 'Ali', 'Zara',
+                'Hamza', 'Fatima', 'Imran', 'Nadia', 'Kamran', 'Sana', 'Tariq', 'Emma', 'James']
+_LAST_NAMES = ['Khan', 'Ahmed', 'Malik', 'Hussain', 'Sheikh', 'Qureshi', 'Butt', 'Raza',
+               'Siddiqui', 'Chaudhry', 'Smith', 'Brown', 'Iqbal', 'Mirza', 'Javed', 'Aziz']
+
+
+def scale(loans):
+    """Table sizes for a dataset of `loans` borrow records."""
+    return {
+        'books': max(loans // 10, 50),
+        'members': max(loans // 20, 20),
+        'staff': max(loans // 50000, 2),
+        'loans': loans,
+    }
+
+
+def _zipf_weights(n, s=1.1):
+    # A few titles and members account for most of the loans
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def generate(books, members, staff, loans, seed=0, chunk_size=5000, today=None):
+    """Fill the database with the given number of rows.
+
+    Returns {'member': username, 'staff': username} of the heaviest
+    borrower and one staff account to log in as (password PASSWORD).
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    now = timezone.now()
+    password = make_password(PASSWORD)
+
+    with transaction.atomic():
+        users = _bulk(User, ([User(username=f'{role}{i}', password=password,
+                                   first_name=rng.choice(_FIRST_NAMES), last_name=rng.choice(_LAST_NAMES),
+                                   email=f'{role}{i}@example.com')
+                              for role, count in (('staff', staff), ('member', members))
+                              for i in range(count)]), chunk_size)
+        staff_users, member_users = users[:staff], users[staff:]
+
+        _bulk(Staff, (Staff(user=user, gender=rng.choice(['Male', 'Female']),
+                            date_of_birth=date(1970, 1, 1) + timedelta(days=rng.randrange(12000)),
+                            last_activity=now - timedelta(minutes=rng.randrange(60 * 24)))
+                      for user in staff_users), chunk_size)
+
+        member_rows = []
+        for user in member_users:
+            # Last activity from seconds to months ago, most members idle
+            idle = timedelta(seconds=rng.expovariate(1 / (3600 * 24 * 20)))
+            member_rows.append(Member(
+                user=user, gender=rng.choice(['Male', 'Female']),
+                date_of_birth=date(1960, 1, 1) + timedelta(days=rng.randrange(18000)),
+                is_blocked=rng.random() < 0.02, last_activity=now - idle,
+                lib_id=f'MBR-{user.id:07d}'))
+        member_ids = [member.id for member in _bulk(Member, member_rows, chunk_size)]
+
+        genres, genre_weights = zip(*GENRE_WEIGHTS.items())
+        authors = [f'{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}' for _ in range(max(books // 8, 1))]
+        author_weights = _zipf_weights(len(authors))
+        book_rows = []
+        for i in range(books):
+            book_rows.append(Book(
+                Title=f'The {rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)} {i}',
+                Author=rng.choices(authors, cum_weights=author_weights)[0],
+                Price=int(min(max(rng.lognormvariate(6.7, 0.5), 150), 9000)),
+                Published_date=today - timedelta(days=int(rng.betavariate(1.2, 4) * 365 * 80)),
+                Image='', ISBN=f'978{seed:02d}{i:08d}',
+                Pages=int(min(max(rng.gauss(320, 120), 48), 1500)),
+                Genre=rng.choices(genres, genre_weights)[0]))
+        book_ids = [book.id for book in _bulk(Book, book_rows, chunk_size)]
+        _bulk(BookCopy, (BookCopy(book_id=book.id, barcode=book.ISBN) for book in book_rows), chunk_size)
+
+        # Popular books and heavy borrowers, in a shuffled order so they are
+        # not simply the first ids
+        book_weights = _zipf_weights(len(book_ids), 0.9)
+        member_weights = _zipf_weights(len(member_ids), 0.8)
+        popular_books = rng.sample(book_ids, len(book_ids))
+        busy_members = rng.sample(member_ids, len(member_ids))
+
+        on_loan = set()
+        records = []
+        for _ in range(loans):
+            book_id = rng.choices(popular_books, cum_weights=book_weights)[0]
+            member_id = rng.choices(busy_members, cum_weights=member_weights)[0]
+            borrowed = today - timedelta(days=rng.randrange(730))
+            due = borrowed + timedelta(days=LOAN_DAYS)
+            kept = timedelta(days=max(1, int(rng.gammavariate(2, 6))))
+            still_out = borrowed + kept > today or rng.random() < 0.01
+            if still_out and book_id not in on_loan:
+                on_loan.add(book_id)
+                fine = compute_fine(due, today)
+                records.append(BorrowRecord(book_id=book_id, borrower_id=member_id, borrow_date=borrowed,
+                                            due_date=due, fine=fine, is_overdue=fine > 0))
+            else:
+                returned = min(borrowed + kept, today)
+                fine = compute_fine(due, returned)
+                records.append(BorrowRecord(book_id=book_id, borrower_id=member_id, borrow_date=borrowed,
+                                            due_date=due, return_date=returned, is_returned=True,
+                                            fine=fine, is_overdue=fine > 0, borrow_duration=returned - borrowed))
+            if len(records) >= chunk_size:
+                BorrowRecord.objects.bulk_create(records)
+                records = []
+        BorrowRecord.objects.bulk_create(records)
+
+        for chunk in _chunks(sorted(on_loan), chunk_size):
+            Book.objects.filter(id__in=chunk).update(Status='unavailable', copies_available=0,
+                                                     Updated_on=timezone.now())
+
+    search.rebuild_index()
+    stats.reconcile(today)
+
+    # The heaviest borrower, whose pages are the slowest to build
+    heaviest = (Member.objects.filter(is_blocked=False).annotate(loans=Count('borrowrecord'))
+                .order_by('-loans', 'id').values_list('user__username', flat=True).first())
+    return {
+        'member': heaviest,
+        'staff': staff_users[0].username,
+    }
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _bulk(model, objs, chunk_size):
+    created = []
+    for chunk in _chunks(list(objs), chunk_size):
+        created.extend(model.objects.bulk_create(chunk))
+    return created
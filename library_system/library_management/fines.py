@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BorrowRecord
+
+LOAN_DAYS = 14
+FINE_PER_DAY = 10  # PKR per overdue day
+
+
+def compute_fine(due_date, today=None):
+    today = today or date.today()
+    if today > due_date:
+        return (today - due_date).days * FINE_PER_DAY
+    return 0
+
+
+def refresh_overdue(today=None, chunk_size=5000):
+    """Bring is_overdue/fine of every open loan up to date.
+
+    Every open loan with the same due date owes the same fine, so the work is
+    one UPDATE per (due date, chunk of ids) instead of one per loan. Loans that
+    already hold the right values are excluded, which makes repeated runs on
+    the same day touch nothing. Returns the number of rows changed.
+    """
+    today = today or date.today()
+    open_loans = BorrowRecord.objects.filter(return_date__isnull=True)
+    changed = 0
+
+    # Loans that are not (or no longer) overdue, e.g. after a due date was extended
+    changed += _update_in_chunks(
+        open_loans.filter(due_date__gte=today).filter(Q(is_overdue=True) | ~Q(fine=0)),
+        chunk_size, is_overdue=False, fine=0)
+
+    due_dates = (open_loans.filter(due_date__lt=today)
+                 .values_list('due_date', flat=True).distinct().order_by('due_date'))
+    for due_date in list(due_dates):
+        fine = compute_fine(due_date, today)
+        stale = (open_loans.filter(due_date=due_date)
+                 .filter(Q(is_overdue=False) | ~Q(fine=fine)))
+        changed += _update_in_chunks(stale, chunk_size, is_overdue=True, fine=fine)
+
+    return changed
+
+
+def _update_in_chunks(queryset, chunk_size, **values):
+    changed = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return changed
+            changed += BorrowRecord.objects.filter(id__in=ids).update(Updated_on=timezone.now(), **values)
+        if len(ids) < chunk_size:
+            return changed
@@ -0,0 +1,107 @@
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import stats
+from .circulation import new_copies
+from .models import Book, BookCopy
+from .search import index_books
+
+# Bulk catalog import used by `manage.py import_books`. Rows are streamed from
+# the file one at a time, validated against the Book fields and inserted with
+# bulk_create one chunk per transaction, so memory use is bounded by the
+# chunk size and not by the file.
+
+REQUIRED = ['Title', 'Author', 'ISBN', 'Price', 'Pages', 'Genre']
+OPTIONAL = ['Published_date', 'Image', 'Status', 'copies_total']
+
+# Column names are matched case-insensitively, so "title" and "isbn" work too
+_COLUMNS = {name.lower(): name for name in REQUIRED + OPTIONAL}
+_COLUMNS['copies'] = 'copies_total'
+_GENRES = {}
+for key, label in Book.Genre_CHOICE:
+    _GENRES[key] = key
+    _GENRES[label.lower()] = key
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def read_rows(path, fmt=None):
+    """Yield (line number, dict) for every record in a CSV or JSONL file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = e
+                yield line_num, row
+
+
+def clean_row(row):
+    """Turn one input record into an unsaved Book or raise InvalidRow."""
+    if isinstance(row, Exception):
+        raise InvalidRow(f'not valid JSON ({row})')
+    if not isinstance(row, dict):
+        raise InvalidRow('expected an object')
+
+    values = {}
+    for column, value in row.items():
+        name = _COLUMNS.get(str(column).strip().lower())
+        if name is None or value is None:
+            continue
+        value = str(value).strip()
+        if value:
+            values[name] = value
+
+    missing = [name for name in REQUIRED if name not in values]
+    if missing:
+        raise InvalidRow(f'missing {", ".join(missing)}')
+    values['Genre'] = _GENRES.get(values['Genre'].lower(), values['Genre'])
+
+    cleaned = {}
+    for name, value in values.items():
+        if name == 'Image':
+            cleaned[name] = value
+            continue
+        try:
+            cleaned[name] = Book._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            raise InvalidRow(f'{name}: {" ".join(e.messages)}')
+    if cleaned.get('copies_total') == 0:
+        raise InvalidRow('copies_total: must be at least 1')
+    book = Book(**cleaned)
+    # An 'unavailable' row is taken to have all its copies out
+    book.copies_available = 0 if book.Status == 'unavailable' else book.copies_total
+    return book
+
+
+def import_chunk(books):
+    """Insert the books whose ISBN is not in the catalog yet, in one
+    transaction. Returns (inserted, duplicates)."""
+    unique = {}
+    for book in books:
+        unique.setdefault(book.ISBN, book)
+    with transaction.atomic():
+        # An ISBN can also live on as the barcode of a copy of a folded title
+        existing = set(Book.objects.filter(ISBN__in=list(unique)).values_list('ISBN', flat=True))
+        existing.update(BookCopy.objects.filter(barcode__in=list(unique)).values_list('barcode', flat=True))
+        new = [book for isbn, book in unique.items() if isbn not in existing]
+        # bulk_create skips signals, so do their work here
+        created = Book.objects.bulk_create(new)
+        BookCopy.objects.bulk_create([copy for book in created
+                                      for copy in new_copies(book, book.copies_total, numbered=0)])
+        index_books(created)
+        stats.adjust(books=len(created))
+    return len(created), len(books) - len(created)
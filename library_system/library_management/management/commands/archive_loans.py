@@ -0,0 +1,28 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library_management.archive import archive_loans
+
+
+class Command(BaseCommand):
+    help = ('Move loans returned long ago from the live loan table to the archive in small '
+            'transactions (safe to run from cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_LOANS_AFTER_DAYS,
+                            help='Archive loans returned more than this many days ago '
+                                 '(default ARCHIVE_LOANS_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Loans moved per transaction (default 1000)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches so requests can get the write lock')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        before = date.today() - timedelta(days=options['days'])
+        moved = archive_loans(before, chunk_size=options['batch_size'], pause=options['pause'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} loans returned before {before} in {elapsed:.2f}s.'))
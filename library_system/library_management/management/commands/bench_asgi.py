@@ -0,0 +1,151 @@
+import asyncio
+import io
+import json
+import sys
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from library_management.bench import benchmark_database
+from library_management.datagen import PASSWORD, generate, scale
+from library_management.management.commands.bench_views import percentile
+
+# The pages that have async versions in async_views.py, with the role to log in as
+PAGES = [
+    ('member', '/home/'),
+    ('member', '/available_books/'),
+    ('member', '/my_books/'),
+    ('member', '/history/'),
+    ('staff', '/staff_dashboard/'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compare request throughput of the async pages served by asgi.py with the sync '
+            'pages served by wsgi.py, on a throwaway database. Requests are fed to the '
+            'application objects in-process (threads for WSGI, tasks for ASGI), so no '
+            'HTTP server is involved.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=10000, help='Dataset size in borrow records')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='WSGI worker threads / concurrent ASGI requests (default 8)')
+        parser.add_argument('--seconds', type=float, default=3.0, help='Duration per page and server')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    def handle(self, *args, **options):
+        from library_system.asgi import application as asgi_app
+        from library_system.wsgi import application as wsgi_app
+
+        with benchmark_database(), override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            users = generate(**scale(options['loans']))
+            cookies = {}
+            for role in ('member', 'staff'):
+                client = Client()
+                client.post('/login/', {'username': users[role], 'loginpwd': PASSWORD})
+                cookies[role] = f'sessionid={client.cookies["sessionid"].value}'
+
+            result = {'loans': options['loans'], 'concurrency': options['concurrency'], 'pages': {}}
+            for role, path in PAGES:
+                wsgi = self.run_wsgi(wsgi_app, path, cookies[role], options)
+                asgi = asyncio.run(self.run_asgi(asgi_app, path, cookies[role], options))
+                result['pages'][path] = {'wsgi': wsgi, 'asgi': asgi}
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(f'{"page":<20} {"server":<6} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+        for path, servers in result['pages'].items():
+            for server, numbers in servers.items():
+                self.stdout.write(f'{path:<20} {server:<6} {numbers["requests_per_sec"]:>8} '
+                                  f'{numbers["p50_ms"]:>8} {numbers["p95_ms"]:>8}')
+
+    def summary(self, timings, statuses, elapsed):
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'requests_per_sec': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'status': sorted(statuses),
+        }
+
+    def run_wsgi(self, app, path, cookie, options):
+        timings, statuses = [], set()
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def worker():
+            local = []
+            while time.monotonic() < deadline:
+                environ = {
+                    'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                    'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'HTTP_HOST': 'testserver',
+                    'HTTP_COOKIE': cookie, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                    'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+                    'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                    'wsgi.run_once': False,
+                }
+                status = []
+                started = time.perf_counter()
+                body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+                try:
+                    for _ in body:
+                        pass
+                finally:
+                    body.close()
+                local.append((time.perf_counter() - started, int(status[0].split()[0])))
+            with lock:
+                for duration, code in local:
+                    timings.append(duration)
+                    statuses.add(code)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.summary(timings, statuses, time.monotonic() - started)
+
+    async def run_asgi(self, app, path, cookie, options):
+        timings, statuses = [], set()
+        deadline = time.monotonic() + options['seconds']
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'root_path': '', 'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+
+        async def one_request():
+            sent = False
+
+            async def receive():
+                nonlocal sent
+                if not sent:
+                    sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects; Django cancels this wait itself
+                await asyncio.Event().wait()
+
+            status = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            started = time.perf_counter()
+            await app(dict(scope), receive, send)
+            timings.append(time.perf_counter() - started)
+            statuses.add(status[0])
+
+        async def worker():
+            while time.monotonic() < deadline:
+                await one_request()
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        return self.summary(timings, statuses, time.monotonic() - started)
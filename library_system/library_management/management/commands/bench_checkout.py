@@ -0,0 +1,140 @@
+import json
+import random
+import threading
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+
+from library_management.bench import benchmark_database
+from library_management.circulation import (BookUnavailable, CirculationBusy, LoanNotFound,
+                                            checkin, checkout)
+from library_management.models import Book, BorrowRecord, Member
+
+
+def naive_checkout(book_id, member):
+    # The pre-transaction read-then-write path, kept only for comparison
+    book = Book.objects.get(id=book_id)
+    if book.copies_available < 1:
+        raise BookUnavailable(book_id)
+    BorrowRecord.objects.create(book=book, borrower=member, borrow_date=date.today(),
+                                due_date=date.today())
+    book.copies_available -= 1
+    book.Status = 'available' if book.copies_available else 'unavailable'
+    book.save()
+
+
+class Command(BaseCommand):
+    help = ('Race parallel clients for a small pool of books on a throwaway database, '
+            'check that no book is ever lent twice and report checkouts/sec')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--books', type=int, default=10)
+        parser.add_argument('--copies', type=int, default=1, help='Copies of each book')
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--hold-ms', type=float, default=2.0,
+                            help='How long a client keeps a book before returning it')
+        parser.add_argument('--naive', action='store_true',
+                            help='Use the old unlocked read-then-write checkout instead')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            result = self.run(options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        for key, value in result.items():
+            self.stdout.write(f'{key:>18}: {value}')
+        if result['double_loans']:
+            self.stdout.write(self.style.ERROR('Books were lent out more often than they have copies!'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No double loans.'))
+
+    def run(self, options):
+        clients, seconds, copies = options['clients'], options['seconds'], options['copies']
+        users = User.objects.bulk_create([User(username=f'bench{i}') for i in range(clients)])
+        members = Member.objects.bulk_create([
+            Member(user=user, gender='Male', date_of_birth=date(2000, 1, 1)) for user in users])
+        books = Book.objects.bulk_create([
+            Book(Title=f'Bench {i}', Author='Bench', Price=1, ISBN=f'BENCH-{i}', Pages=1,
+                 Genre='fiction', Image='', copies_total=copies, copies_available=copies)
+            for i in range(options['books'])])
+        book_ids = [book.id for book in books]
+        do_checkout = naive_checkout if options['naive'] else checkout
+
+        # Who currently holds copies of each book according to the successful checkouts
+        holders = {book_id: set() for book_id in book_ids}
+        holders_lock = threading.Lock()
+        stats = {'checkouts': 0, 'conflicts': 0, 'busy': 0, 'double_loans': 0}
+        stats_lock = threading.Lock()
+        hold = options['hold_ms'] / 1000
+        deadline = time.monotonic() + seconds
+
+        def client(member):
+            local = dict.fromkeys(stats, 0)
+            rng = random.Random(member.id)
+            try:
+                while time.monotonic() < deadline:
+                    book_id = rng.choice(book_ids)
+                    try:
+                        do_checkout(book_id, member)
+                    except BookUnavailable:
+                        local['conflicts'] += 1
+                        continue
+                    except (CirculationBusy, OperationalError):
+                        local['busy'] += 1
+                        continue
+
+                    local['checkouts'] += 1
+                    with holders_lock:
+                        if len(holders[book_id]) >= copies:
+                            local['double_loans'] += 1
+                        holders[book_id].add(member.id)
+
+                    time.sleep(hold)
+                    with holders_lock:
+                        holders[book_id].discard(member.id)
+
+                    # Keep retrying so a busy database never strands a book
+                    while True:
+                        try:
+                            checkin(book_id, member)
+                            break
+                        except CirculationBusy:
+                            local['busy'] += 1
+                        except LoanNotFound:
+                            break
+            finally:
+                with stats_lock:
+                    for key, value in local.items():
+                        stats[key] += value
+                connections.close_all()
+
+        threads = [threading.Thread(target=client, args=(member,)) for member in members]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        # Loans that were never closed because a second copy of them existed
+        stats['double_loans'] += (BorrowRecord.objects.filter(is_returned=False)
+                                  .values('book').annotate(n=Count('id')).filter(n__gt=1).count())
+
+        return {
+            'mode': 'naive' if options['naive'] else 'atomic',
+            'database': connection.vendor,
+            'clients': clients,
+            'books': len(book_ids),
+            'copies': copies,
+            'seconds': round(elapsed, 2),
+            **stats,
+            'checkouts_per_sec': round(stats['checkouts'] / elapsed, 1),
+        }
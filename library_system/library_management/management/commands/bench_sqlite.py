@@ -0,0 +1,162 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from library_management.bench import benchmark_database
+from library_management.datagen import PASSWORD, generate, scale
+from library_management.management.commands.bench_views import percentile
+from library_management.models import Member
+
+# Pages the readers cycle through, as the heaviest borrower
+READ_PAGES = ['/available_books/', '/history/', '/home/', '/api/v1/books/']
+# Profiles updated per write, like one flush of the activity tracker
+WRITE_BATCH = 100
+
+
+class Command(BaseCommand):
+    help = ('Race reader threads (member pages) against writer threads (activity timestamp '
+            'flushes) on a throwaway SQLite database, once with SQLite defaults and a '
+            'connection per request and once with SQLITE_PRAGMAS and CONN_MAX_AGE, and '
+            'report throughput and latency of both')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=10000, help='Dataset size in borrow records')
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile')
+        parser.add_argument('--write-pause', type=float, default=0.01,
+                            help='Seconds a writer sleeps between flushes (default 0.01)')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_sqlite only runs on SQLite')
+        profiles = {
+            'default': ({}, 0),
+            'tuned': (settings.SQLITE_PRAGMAS, settings.DATABASES['default'].get('CONN_MAX_AGE', 0)),
+        }
+        result = {'loans': options['loans'], 'readers': options['readers'], 'writers': options['writers'],
+                  'profiles': {}}
+        for name, (pragmas, max_age) in profiles.items():
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], SQLITE_PRAGMAS=pragmas), \
+                    conn_max_age(max_age), benchmark_database():
+                users = generate(**scale(options['loans']))
+                result['profiles'][name] = self.run(users, options)
+                result['profiles'][name]['journal_mode'] = self.journal_mode()
+                connections.close_all()
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(f'{"profile":<9} {"reads/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                          f'{"writes/s":>9} {"w p95 ms":>9} {"errors":>7}')
+        for name, numbers in result['profiles'].items():
+            self.stdout.write(f'{name:<9} {numbers["reads_per_sec"]:>8} {numbers["read_p50_ms"]:>8} '
+                              f'{numbers["read_p95_ms"]:>8} {numbers["read_p99_ms"]:>8} '
+                              f'{numbers["writes_per_sec"]:>9} {numbers["write_p95_ms"]:>9} '
+                              f'{numbers["errors"]:>7}')
+
+    def journal_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def run(self, users, options):
+        client = Client()
+        client.post('/login/', {'username': users['member'], 'loginpwd': PASSWORD})
+        session = client.cookies['sessionid'].value
+        member_ids = list(Member.objects.values_list('id', flat=True))
+        connections.close_all()
+
+        reads, writes, errors = [], [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def reader(seed):
+            rng = random.Random(seed)
+            reader_client = Client()
+            reader_client.cookies['sessionid'] = session
+            local, failed = [], 0
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = reader_client.get(rng.choice(READ_PAGES))
+                        ok = response.status_code == 200
+                    except DatabaseError:
+                        ok = False
+                    if ok:
+                        local.append(time.perf_counter() - started)
+                    else:
+                        failed += 1
+            finally:
+                with lock:
+                    reads.extend(local)
+                    errors.append(failed)
+                connections.close_all()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            local, failed = [], 0
+            try:
+                while time.monotonic() < deadline:
+                    # Opened and closed like a request would, per CONN_MAX_AGE
+                    close_old_connections()
+                    batch = rng.sample(member_ids, min(WRITE_BATCH, len(member_ids)))
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            Member.objects.filter(id__in=batch).update(last_activity=timezone.now())
+                        local.append(time.perf_counter() - started)
+                    except DatabaseError:
+                        failed += 1
+                    close_old_connections()
+                    time.sleep(options['write_pause'])
+            finally:
+                with lock:
+                    writes.extend(local)
+                    errors.append(failed)
+                connections.close_all()
+
+        threads = ([threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])] +
+                   [threading.Thread(target=writer, args=(-i - 1,)) for i in range(options['writers'])])
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        reads.sort()
+        writes.sort()
+        return {
+            'reads': len(reads),
+            'reads_per_sec': round(len(reads) / elapsed, 1),
+            'read_p50_ms': round(percentile(reads, 50) * 1000, 2) if reads else None,
+            'read_p95_ms': round(percentile(reads, 95) * 1000, 2) if reads else None,
+            'read_p99_ms': round(percentile(reads, 99) * 1000, 2) if reads else None,
+            'writes': len(writes),
+            'writes_per_sec': round(len(writes) / elapsed, 1),
+            'write_p95_ms': round(percentile(writes, 95) * 1000, 2) if writes else None,
+            'errors': sum(errors),
+        }
+
+
+@contextmanager
+def conn_max_age(seconds, alias='default'):
+    # Every thread's connection is built from this same settings dict
+    settings_dict = connections[alias].settings_dict
+    old = settings_dict.get('CONN_MAX_AGE', 0)
+    settings_dict['CONN_MAX_AGE'] = seconds
+    try:
+        yield
+    finally:
+        settings_dict['CONN_MAX_AGE'] = old
@@ -0,0 +1,237 @@
+import json
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import get_resolver
+
+from library_management.bench import benchmark_database
+from library_management.datagen import PASSWORD, generate, scale
+from library_management.models import Book, BorrowRecord, Hold, Member
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1M': 1000000}
+
+
+class Case:
+    """One benchmarked request against a route.
+
+    `path` and `data` are callables of (ctx, i) so every iteration can use
+    different ids; `setup` runs before each iteration outside the timing.
+    """
+
+    def __init__(self, route, role, method='GET', path=None, data=None, setup=None, label=None):
+        self.route, self.role, self.method = route, role, method
+        self.path, self.data, self.setup = path, data, setup
+        self.label = label
+
+    @property
+    def name(self):
+        # Stable across runs and scales so reports can be diffed
+        name = f'{self.method} {self.route}'
+        return f'{name} ({self.label})' if self.label else name
+
+
+def _book_form(prefix):
+    def data(ctx, i):
+        return {'title': f'Bench Book {i}', 'author': 'Bench Author', 'isbn': f'{prefix}-{ctx["run"]}-{i}',
+                'published_date': '2020-01-01', 'genre': 'fiction', 'price': '500', 'pages': '300'}
+    return data
+
+
+def _find_hold(client, ctx, i):
+    # The hold the reserve_book case placed in the same iteration
+    ctx['hold'] = Hold.objects.get(book_id=ctx['on_loan'][i], member_id=ctx['member_id'], status='waiting').id
+
+
+def _relogin(client, ctx, i):
+    client.post('/login/', {'username': ctx['users'][ctx['role']], 'loginpwd': PASSWORD})
+
+
+# Every route in urls.py, requested as the role that can reach it. Writes come
+# after the reads so they do not change what the reads measure, and each write
+# iteration works on its own book.
+CASES = [
+    Case('index', None, path=lambda ctx, i: '/'),
+    Case('login', None, path=lambda ctx, i: '/login/'),
+    Case('login', None, 'POST', path=lambda ctx, i: '/login/',
+         data=lambda ctx, i: {'username': ctx['users']['member'], 'loginpwd': PASSWORD}),
+    Case('signup', None, path=lambda ctx, i: '/signup/'),
+    Case('user', 'member', path=lambda ctx, i: '/home/'),
+    Case('available_books', 'member', path=lambda ctx, i: '/available_books/'),
+    Case('available_books', 'member', path=lambda ctx, i: '/available_books/?genre=mystery&sort=title-asc',
+         label='filtered'),
+    Case('search', 'member', path=lambda ctx, i: '/search/?q=silent+river'),
+    Case('my_books', 'member', path=lambda ctx, i: '/my_books/'),
+    Case('member_history', 'member', path=lambda ctx, i: '/history/'),
+    Case('fines', 'member', path=lambda ctx, i: '/fines/'),
+    Case('reservations', 'member', path=lambda ctx, i: '/reservations/'),
+    Case('forget_password', 'member', path=lambda ctx, i: '/Password Reset'),
+    Case('settings', 'member', path=lambda ctx, i: '/settings/'),
+    Case('staff_dashboard', 'staff', path=lambda ctx, i: '/staff_dashboard/'),
+    Case('add_book', 'staff', path=lambda ctx, i: '/add_book/'),
+    Case('manage_books', 'staff', path=lambda ctx, i: '/manage_books/'),
+    Case('manage_members', 'staff', path=lambda ctx, i: '/manage_members/'),
+    Case('metrics', 'staff', path=lambda ctx, i: '/metrics/'),
+    Case('export_loans', 'staff', path=lambda ctx, i: '/export_loans/?state=returned'),
+    Case('api_books', 'member', path=lambda ctx, i: '/api/v1/books/?status=available&limit=24'),
+    Case('api_books', 'member', path=lambda ctx, i: '/api/v1/books/?status=available&limit=24&fields=Title,Author,Status',
+         label='sparse'),
+    Case('api_loans', 'member', path=lambda ctx, i: '/api/v1/loans/'),
+    Case('edit_book', 'staff', path=lambda ctx, i: f'/edit_book/{ctx["books"][0]}'),
+    Case('edit_member', 'staff', path=lambda ctx, i: f'/edit_member/{ctx["member_id"]}'),
+    Case('borrow_book', 'member', 'POST', path=lambda ctx, i: f'/borrow_book/{ctx["books"][i]}'),
+    Case('return_book', 'member', 'POST', path=lambda ctx, i: f'/return_book/{ctx["books"][i]}'),
+    Case('reserve_book', 'member', 'POST', path=lambda ctx, i: f'/reserve_book/{ctx["on_loan"][i]}'),
+    Case('cancel_reservation', 'member', 'POST', path=lambda ctx, i: f'/cancel_reservation/{ctx["hold"]}',
+         setup=_find_hold),
+    Case('add_book', 'staff', 'POST', path=lambda ctx, i: '/add_book/', data=_book_form('ADD')),
+    Case('edit_book', 'staff', 'POST', path=lambda ctx, i: f'/edit_book/{ctx["books"][i]}', data=_book_form('EDIT')),
+    Case('delete_book', 'staff', 'POST', path=lambda ctx, i: f'/delete_book/{ctx["books"][-1 - i]}'),
+    Case('register', None, 'POST', path=lambda ctx, i: '/register/',
+         data=lambda ctx, i: {'role': 'member', 'fname': 'Bench', 'lname': 'User', 'email': 'b@example.com',
+                              'username': f'bench-{ctx["run"]}-{i}', 'password': PASSWORD,
+                              'gender': 'Male', 'dob': '2000-01-01'}),
+    Case('logout', 'member', path=lambda ctx, i: '/logout/', setup=_relogin),
+]
+
+
+def percentile(ordered, p):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic library at each scale on a throwaway database and time every '
+            'route in urls.py. Reports p50/p95/p99 latency, queries and peak memory as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', choices=list(SCALES),
+                            help='Dataset size in borrow records, repeatable (default 1k)')
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per case (default 30)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--route', action='append', help='Only run cases for these route names')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        routes = {pattern.name for pattern in get_resolver('library_management.urls').url_patterns}
+        missing = routes - {case.route for case in CASES}
+        if missing:
+            raise CommandError(f'No benchmark case for routes: {", ".join(sorted(missing))}')
+        cases = [case for case in CASES if not options['route'] or case.route in options['route']]
+
+        report = {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests_per_case': options['requests'],
+            'seed': options['seed'],
+            'scales': {},
+        }
+        # Production-like settings: no per-query logging from DEBUG. The test
+        # environment is not set up either, its template instrumentation
+        # would distort the timings.
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            for name in options['scale'] or ['1k']:
+                report['scales'][name] = self.run_scale(SCALES[name], cases, options)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run_scale(self, loans, cases, options):
+        with benchmark_database():
+            sizes = scale(loans)
+            started = time.monotonic()
+            users = generate(**sizes, seed=options['seed'])
+            self.stderr.write(f'Generated {loans} loans in {time.monotonic() - started:.1f}s')
+
+            requests = options['requests']
+            # Available books for the write cases, each iteration its own book
+            ctx = {
+                'users': users,
+                'run': loans,
+                'member_id': Member.objects.get(user__username=users['member']).id,
+                'books': list(Book.objects.filter(Status='available').order_by('id')
+                              .values_list('id', flat=True)[:requests + 1]),
+            }
+            # Books out with other members, to reserve
+            member_loans = BorrowRecord.objects.filter(borrower_id=ctx['member_id'], is_returned=False)
+            ctx['on_loan'] = list(Book.objects.filter(Status='unavailable')
+                                  .exclude(id__in=member_loans.values('book_id')).order_by('id')
+                                  .values_list('id', flat=True)[:requests + 1])
+            if len(ctx['books']) <= requests or len(ctx['on_loan']) <= requests:
+                raise CommandError('Not enough available and lent books for --requests; use a bigger scale')
+
+            clients = {}
+            for role in ('member', 'staff'):
+                clients[role] = Client()
+                clients[role].post('/login/', {'username': users[role], 'loginpwd': PASSWORD})
+
+            results = {'sizes': sizes, 'views': {}}
+            for case in cases:
+                key = case.name
+                # Anonymous cases get a fresh client, a login case would log the next one in
+                client = clients[case.role] if case.role else Client()
+                results['views'][key] = self.run_case(case, client, dict(ctx, role=case.role), requests)
+                self.stderr.write(f'{key}: p50 {results["views"][key]["p50_ms"]} ms')
+            return results
+
+    def run_case(self, case, client, ctx, requests):
+        timings, statuses = [], set()
+        queries = []
+        counter = []
+
+        def count(execute, sql, params, many, context):
+            counter.append(1)
+            return execute(sql, params, many, context)
+
+        for i in range(requests):
+            if case.setup:
+                case.setup(client, ctx, i)
+            data = case.data(ctx, i) if case.data else None
+            counter.clear()
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                response = getattr(client, case.method.lower())(case.path(ctx, i), data)
+                if response.streaming:
+                    # Time the whole body, not just the first byte
+                    for _ in response.streaming_content:
+                        pass
+                timings.append(time.perf_counter() - started)
+            queries.append(len(counter))
+            statuses.add(response.status_code)
+
+        # Peak memory in a separate, untimed request: tracemalloc slows
+        # everything down too much to run while timing
+        if case.setup:
+            case.setup(client, ctx, requests)
+        data = case.data(ctx, requests) if case.data else None
+        tracemalloc.start()
+        try:
+            response = getattr(client, case.method.lower())(case.path(ctx, requests), data)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+            'max_ms': round(timings[-1] * 1000, 2),
+            'queries': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
@@ -0,0 +1,23 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library_management.circulation import expire_holds
+
+
+class Command(BaseCommand):
+    help = ('Expire reservations not picked up in time and pass each book to the next member '
+            'in line (safe to run from cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Holds expired per transaction (default 500)')
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Expire as of this date (YYYY-MM-DD), defaults to today')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        expired = expire_holds(today=options['date'], chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} holds in {elapsed:.2f}s.'))
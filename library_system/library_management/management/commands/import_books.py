@@ -0,0 +1,84 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library_management.importer import InvalidRow, clean_row, import_chunk, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Import books from a CSV or JSONL file. Rows are validated, deduplicated '
+            'by ISBN and inserted in chunks; an interrupted import can be resumed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format, guessed from the file extension by default')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Books inserted per transaction (default 1000)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows a previous run already committed')
+        parser.add_argument('--progress-file',
+                            help='Where committed progress is recorded (default <path>.progress)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        progress_file = options['progress_file'] or path + '.progress'
+        chunk_size = options['chunk_size']
+
+        # The row offset only means something for the file it was counted in
+        source = self.source(path)
+        skip = 0
+        if options['resume'] and os.path.exists(progress_file):
+            with open(progress_file) as f:
+                progress = json.load(f)
+            if progress.get('source') != source:
+                raise CommandError(f'{progress_file} was written for a different or changed input file; '
+                                   'remove it to import from the start')
+            skip = progress['rows']
+            self.stdout.write(f'Resuming after {skip} rows.')
+
+        totals = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0}
+        chunk = []
+        started = time.monotonic()
+
+        def flush():
+            inserted, duplicates = import_chunk(chunk)
+            totals['inserted'] += inserted
+            totals['duplicates'] += duplicates
+            chunk.clear()
+            # Only rows of committed chunks count as done
+            with open(progress_file, 'w') as f:
+                json.dump({'source': source, 'rows': totals['rows']}, f)
+            self.report(totals, skip, started)
+
+        for line_num, row in read_rows(path, options['format']):
+            totals['rows'] += 1
+            if totals['rows'] <= skip:
+                continue
+            try:
+                chunk.append(clean_row(row))
+            except InvalidRow as e:
+                totals['invalid'] += 1
+                self.stderr.write(f'line {line_num}: {e}')
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+
+        os.remove(progress_file)
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {totals["inserted"]} books added, {totals["duplicates"]} duplicate ISBNs '
+            f'and {totals["invalid"]} invalid rows skipped.'))
+
+    def source(self, path):
+        stat = os.stat(path)
+        return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def report(self, totals, skipped, started):
+        elapsed = time.monotonic() - started
+        rate = (totals['rows'] - skipped) / elapsed if elapsed else 0
+        self.stdout.write(f'{totals["rows"]} rows, {totals["inserted"]} inserted '
+                          f'({rate:.0f} rows/sec)')
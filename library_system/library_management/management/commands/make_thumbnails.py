@@ -0,0 +1,82 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library_management.models import Book
+from library_management.thumbnails import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate the WebP/JPEG thumbnails of book covers that do not have them yet, using all cores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-check every cover, not only books without thumbnails')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per core)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Covers handed to the workers, and hashes saved, per batch (default 500)')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(Image='')
+        if not options['all']:
+            books = books.filter(Image_hash='')
+        books = books.only('id', 'Image', 'Image_hash').order_by('id')
+        if not books.exists():
+            self.stdout.write('All covers have thumbnails.')
+            return
+
+        started = time.monotonic()
+        done, failed, last_id = 0, 0, 0
+        pool = ProcessPoolExecutor(max_workers=options['workers'])
+        try:
+            # One batch at a time, walking the primary key, so only
+            # --batch-size books and futures are held however big the catalog
+            while True:
+                batch = list(books.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                saved, broken = self.run_batch(pool, batch)
+                done += len(saved)
+                failed += len(batch) - len(saved)
+                if broken:
+                    # A worker died (out of memory on a huge cover, a crash in
+                    # the decoder); the pool is unusable, start a new one
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=options['workers'])
+        finally:
+            pool.shutdown()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Thumbnailed {done} covers in {elapsed:.2f}s ({done / elapsed:.1f}/sec), {failed} failed.'))
+
+    def run_batch(self, pool, batch):
+        # The workers only read images and write files; the hashes come back
+        # here and are saved from this process
+        futures = {pool.submit(make_thumbnails, book.Image.path, str(settings.MEDIA_ROOT)): book
+                   for book in batch}
+        saved, broken = [], False
+        for future in as_completed(futures):
+            book = futures[future]
+            try:
+                book.Image_hash = future.result()
+                book.Updated_on = timezone.now()
+            except BrokenProcessPool:
+                broken = True
+                self.stderr.write(f'Book {book.id} ({book.Image.name}): worker process died')
+                continue
+            except Exception as e:
+                # A bad file (truncated, not an image, a decompression bomb)
+                # only fails its own book
+                self.stderr.write(f'Book {book.id} ({book.Image.name}): {e}')
+                continue
+            saved.append(book)
+        Book.objects.bulk_update(saved, ['Image_hash', 'Updated_on'])
+        return saved, broken
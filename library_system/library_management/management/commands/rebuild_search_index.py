@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library_management.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over book titles and authors'
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write(self.style.WARNING('Full-text search needs SQLite; nothing to rebuild.'))
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from library_management.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard statistics from the tables and fix any drift (safe to run from cron)'
+
+    def handle(self, *args, **options):
+        stats, drift = reconcile()
+        for field, (stored, actual) in drift.items():
+            self.stdout.write(self.style.WARNING(f'{field}: {stored} -> {actual}'))
+        self.stdout.write(self.style.SUCCESS(f'{stats}. {len(drift)} counters corrected.'))
@@ -0,0 +1,22 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library_management.fines import refresh_overdue
+
+
+class Command(BaseCommand):
+    help = 'Recompute is_overdue and fine for all open loans (safe to run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows updated per statement/transaction (default 5000)')
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Compute fines as of this date (YYYY-MM-DD), defaults to today')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        changed = refresh_overdue(today=options['date'], chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} loans in {elapsed:.2f}s.'))
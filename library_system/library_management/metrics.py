@@ -0,0 +1,186 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+# In-process request metrics, exported in Prometheus text format by
+# views.metrics.
+#
+# Every thread records into its own shard, so the request path never takes a
+# lock; the global lock is only taken when a thread records for the first time
+# and when the shards are merged for a scrape. Reading a shard while its
+# thread is writing is safe because each update is a single dict/list store
+# under the GIL. Counts are per process: with several worker processes each
+# one reports its own numbers, like any other Prometheus client without a
+# multiprocess collector.
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+HISTOGRAMS = {
+    # name: (buckets, help)
+    'library_request_duration_seconds': (LATENCY_BUCKETS, 'Request latency by view.'),
+    'library_db_queries_per_request': (QUERY_BUCKETS, 'SQL queries run by one request, by view.'),
+    'library_response_size_bytes': (SIZE_BUCKETS, 'Response body size by view.'),
+}
+COUNTERS = {
+    'library_requests_total': 'Requests by view, method and status.',
+    'library_db_query_seconds_total': 'Time spent in SQL queries, by view.',
+    'library_template_render_seconds_total': 'Time spent rendering templates, by view.',
+}
+
+# Measurements of the request being handled, set by MetricsMiddleware. A
+# ContextVar rather than a thread local so it also follows async requests.
+current_request = ContextVar('library_metrics_request', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+def track_query(execute, sql, params, many, context):
+    """connection.execute_wrapper() hook adding each query to the request."""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+class _Shard:
+    def __init__(self):
+        self.counters = {name: {} for name in COUNTERS}
+        # name -> labels -> [count per bucket (last one is +Inf), sum]
+        self.histograms = {name: {} for name in HISTOGRAMS}
+
+    def inc(self, name, labels, amount=1):
+        values = self.counters[name]
+        values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        series = self.histograms[name].get(labels)
+        if series is None:
+            buckets = HISTOGRAMS[name][0]
+            series = self.histograms[name][labels] = [[0] * (len(buckets) + 1), 0]
+        series[0][bisect_left(HISTOGRAMS[name][0], value)] += 1
+        series[1] += value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shards = []
+        self._local = threading.local()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, view, method, status, duration, size, request_metrics):
+        shard = self.shard()
+        labels = (('view', view),)
+        shard.inc('library_requests_total', labels + (('method', method), ('status', str(status))))
+        shard.observe('library_request_duration_seconds', labels, duration)
+        if size is not None:
+            shard.observe('library_response_size_bytes', labels, size)
+        shard.observe('library_db_queries_per_request', labels, request_metrics.queries)
+        shard.inc('library_db_query_seconds_total', labels, request_metrics.db_time)
+        shard.inc('library_template_render_seconds_total', labels, request_metrics.template_time)
+
+    def collect(self):
+        """Merge all shards into ({counter: {labels: value}}, {histogram: {labels: [buckets, sum]}})."""
+        with self._lock:
+            shards = list(self._shards)
+        counters = {name: {} for name in COUNTERS}
+        histograms = {name: {} for name in HISTOGRAMS}
+        for shard in shards:
+            for name, values in shard.counters.items():
+                merged = counters[name]
+                for labels, value in values.copy().items():
+                    merged[labels] = merged.get(labels, 0) + value
+            for name, values in shard.histograms.items():
+                merged = histograms[name]
+                for labels, (buckets, total) in values.copy().items():
+                    into = merged.setdefault(labels, [[0] * len(buckets), 0])
+                    for i, count in enumerate(list(buckets)):
+                        into[0][i] += count
+                    into[1] += total
+        return counters, histograms
+
+    def export(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, text in COUNTERS.items():
+            lines += [f'# HELP {name} {text}', f'# TYPE {name} counter']
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f'{name}{{{_labels(labels)}}} {_number(value)}')
+        for name, (bounds, text) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {text}', f'# TYPE {name} histogram']
+            for labels, (buckets, total) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(bounds + ['+Inf'], buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{_labels(labels + (("le", str(bound)),))}}} {cumulative}')
+                lines.append(f'{name}_sum{{{_labels(labels)}}} {_number(total)}')
+                lines.append(f'{name}_count{{{_labels(labels)}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    return ','.join('{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+
+
+def _number(value):
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds render time to the current request.
+
+    Only templates rendered through the backend (render(), TemplateResponse)
+    are timed; {% include %} and {% extends %} run inside them, so nothing is
+    counted twice.
+    """
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        metrics = current_request.get()
+        if metrics is None:
+            return self._wrapped.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
@@ -1,22 +1,83 @@
-from django.utils import timezone
-from .models import Member,Staff
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from .activity import tracker
+from .metrics import RequestMetrics, current_request, registry
+
+# Both middlewares are sync and async capable, so async views served through
+# asgi.py are not pushed back into a thread by them.
 
 class UpdateLastActivityMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        # Only buffers the timestamp; the tracker writes it back in batches.
         if request.user.is_authenticated:
-            try:
-                if Staff.objects.filter(user=request.user):
-                    user=Staff.objects.get(user=request.user)
-                else:
-                    user=Member.objects.get(user=request.user)
-                
-                user.last_activity = timezone.now()
-                user.save(update_fields=['last_activity'])
-            except:
-                pass
+            tracker.touch(request.user.id)
 
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        if user.is_authenticated and tracker.record(user.id):
+            await sync_to_async(tracker.flush)()
+        return await self.get_response(request)
+
+class MetricsMiddleware:
+    """Record latency, SQL queries/time, template time and response size per
+    URL name into metrics.registry (exported at /metrics/). Queries are
+    counted by metrics.track_query, installed on every connection in signals.py."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, time.perf_counter() - started, request_metrics)
+        return response
+
+    async def __acall__(self, request):
+        # Worker threads started by sync_to_async copy the context, so they
+        # add to the same RequestMetrics
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, time.perf_counter() - started, request_metrics)
+        return response
+
+    def record(self, request, response, duration, request_metrics):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        # Streamed bodies are never held in memory, so their size is unknown here
+        size = None if response.streaming else len(response.content)
+        registry.record(view, request.method, response.status_code, duration, size, request_metrics)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0021_rename_member_id_member_lib_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['is_blocked', 'last_activity'], name='member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staff',
+            index=models.Index(fields=['is_blocked', 'last_activity'], name='staff_status_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:17
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def seed_stats(apps, schema_editor):
+    Book = apps.get_model('library_management', 'Book')
+    Member = apps.get_model('library_management', 'Member')
+    BorrowRecord = apps.get_model('library_management', 'BorrowRecord')
+    LibraryStats = apps.get_model('library_management', 'LibraryStats')
+    today = date.today()
+    open_loans = BorrowRecord.objects.filter(return_date__isnull=True)
+    LibraryStats.objects.create(
+        pk=1,
+        total_books=Book.objects.count(),
+        total_members=Member.objects.count(),
+        active_loans=open_loans.count(),
+        overdue_loans=open_loans.filter(due_date__lt=today).count(),
+        overdue_date=today,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0025_borrowrecord_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_books', models.IntegerField(default=0)),
+                ('total_members', models.IntegerField(default=0)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('overdue_loans', models.IntegerField(default=0)),
+                ('overdue_date', models.DateField(blank=True, null=True)),
+                ('Updated_on', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'library stats',
+            },
+        ),
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0026_library_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='Image_hash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
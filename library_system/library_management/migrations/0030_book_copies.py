@@ -0,0 +1,136 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+FTS_TABLE = 'library_management_book_fts'
+HOLD_PICKUP_DAYS = 3
+CHUNK_SIZE = 2000
+
+
+def _key(value):
+    return ' '.join(value.split()).lower()
+
+
+def fold_titles(apps, schema_editor):
+    # Titles that were entered once per copy (same title and author, compared
+    # case- and whitespace-insensitively) become one Book with a BookCopy per
+    # old row, barcoded with that row's ISBN. The lowest id is kept, loans and
+    # holds of the others are moved onto it.
+    Book = apps.get_model('library_management', 'Book')
+    BookCopy = apps.get_model('library_management', 'BookCopy')
+    BorrowRecord = apps.get_model('library_management', 'BorrowRecord')
+    Hold = apps.get_model('library_management', 'Hold')
+    LibraryStats = apps.get_model('library_management', 'LibraryStats')
+    now = timezone.now()
+
+    # Updated_on is bumped so cached book cards pick up the counters
+    Book.objects.update(copies_available=Case(When(Status='unavailable', then=Value(0)), default=Value(1)),
+                        Updated_on=now)
+
+    titles = {}
+    for book_id, title, author, isbn in (Book.objects.order_by('id')
+                                         .values_list('id', 'Title', 'Author', 'ISBN').iterator(CHUNK_SIZE)):
+        titles.setdefault((_key(title), _key(author)), []).append((book_id, isbn))
+
+    copies = []
+    folded = []
+    for rows in titles.values():
+        keep = rows[0][0]
+        copies.extend(BookCopy(book_id=keep, barcode=isbn) for _, isbn in rows)
+        if len(copies) >= CHUNK_SIZE:
+            BookCopy.objects.bulk_create(copies)
+            copies = []
+        if len(rows) == 1:
+            continue
+        ids = [book_id for book_id, _ in rows]
+        dupes = ids[1:]
+        folded.extend(dupes)
+        BorrowRecord.objects.filter(book_id__in=dupes).update(book_id=keep)
+        available = Book.objects.filter(id__in=ids, Status='available').count()
+        available -= _merge_holds(Hold, keep, dupes, available)
+        Book.objects.filter(id=keep).update(copies_total=len(ids), copies_available=available,
+                                            Status='available' if available else 'unavailable')
+    BookCopy.objects.bulk_create(copies)
+
+    for start in range(0, len(folded), CHUNK_SIZE):
+        chunk = folded[start:start + CHUNK_SIZE]
+        Book.objects.filter(id__in=chunk).delete()
+        if schema_editor.connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(chunk))
+            schema_editor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+    if folded:
+        LibraryStats.objects.filter(pk=1).update(total_books=Book.objects.count())
+
+
+def _merge_holds(Hold, keep, dupes, available):
+    """Append the queues of `dupes` to the one of `keep`, oldest hold first.
+    Returns how many copies the shelf lost (or, if negative, gained): the
+    `available` copies given to waiting holds, less the copies set aside for
+    ready holds that were cancelled."""
+    queue = Hold.objects.filter(book_id=keep)
+    position = queue.order_by('-position').values_list('position', flat=True).first() or 0
+    members = set(queue.filter(status__in=['waiting', 'ready']).values_list('member_id', flat=True))
+    freed = 0
+    for hold in Hold.objects.filter(book_id__in=dupes).order_by('placed_on', 'id'):
+        position += 1
+        hold.book_id = keep
+        hold.position = position
+        if hold.status in ('waiting', 'ready'):
+            if hold.member_id in members:
+                # hold_one_active_per_member. A copy set aside for this hold
+                # is free again and goes to the queue below
+                if hold.status == 'ready':
+                    freed += 1
+                hold.status = 'cancelled'
+            members.add(hold.member_id)
+        hold.save()
+    available += freed
+
+    # Copies that were on the shelf go to members who were waiting for
+    # another row of the same title
+    given = 0
+    expires_on = date.today() + timedelta(days=HOLD_PICKUP_DAYS)
+    for hold in queue.filter(status='waiting').order_by('position')[:available]:
+        hold.status = 'ready'
+        hold.expires_on = expires_on
+        hold.save()
+        given += 1
+    return given - freed
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0029_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_total',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='BookCopy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=60, unique=True)),
+                ('Added_on', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='library_management.book')),
+            ],
+            options={
+                'verbose_name_plural': 'book copies',
+            },
+        ),
+        migrations.RunPython(fold_titles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0030_book_copies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrowRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrow_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('due_date', models.DateField()),
+                ('is_returned', models.BooleanField(default=True)),
+                ('is_overdue', models.BooleanField(default=False)),
+                ('fine', models.IntegerField(default=0)),
+                ('borrow_duration', models.DurationField(blank=True, null=True)),
+                ('Updated_on', models.DateTimeField()),
+                ('archived_on', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library_management.book')),
+                ('borrower', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='library_management.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['borrower', 'borrow_date'], name='archived_loan_history_idx')],
+            },
+        ),
+    ]
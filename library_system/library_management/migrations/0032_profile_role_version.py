@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0031_loan_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='role_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='role_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_management', '0032_profile_role_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedborrowrecord',
+            name='id',
+            field=models.IntegerField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -1,13 +1,61 @@
 from django.contrib.auth.models import AbstractUser, User
 from django.db import models
+from django.db.models import Case, Count, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from datetime import date, timedelta
 from django.utils import timezone
 
+from .thumbnails import SIZES, thumbnail_url
+
 # Create your models here.
 
 def get_expiry_date():
     return date.today() + timedelta(days=365)
 
+# Activity status thresholds shared by the status property and the SQL version
+ONLINE_WITHIN = timedelta(minutes=5)
+AWAY_WITHIN = timedelta(hours=1)
+INACTIVE_AFTER = timedelta(days=30)
+STATUSES = ['Online', 'Away', 'Offline', 'Inactive', 'Blocked']
+
+def status_q(status, now=None):
+    # Each status as a range on last_activity so it can use the
+    # (is_blocked, last_activity) index instead of classifying every row.
+    now = now or timezone.now()
+    if status == 'Blocked':
+        return Q(is_blocked=True)
+    active = Q(is_blocked=False)
+    if status == 'Online':
+        return active & Q(last_activity__gt=now - ONLINE_WITHIN)
+    if status == 'Away':
+        return active & Q(last_activity__gt=now - AWAY_WITHIN, last_activity__lte=now - ONLINE_WITHIN)
+    if status == 'Offline':
+        return active & Q(last_activity__gte=now - INACTIVE_AFTER, last_activity__lte=now - AWAY_WITHIN)
+    if status == 'Inactive':
+        return active & (Q(last_activity__isnull=True) | Q(last_activity__lt=now - INACTIVE_AFTER))
+    raise ValueError(f'Unknown status {status!r}')
+
+class ProfileQuerySet(models.QuerySet):
+    def with_status(self, now=None):
+        # Annotated as activity_status because `status` is a read-only property
+        now = now or timezone.now()
+        return self.annotate(activity_status=Case(
+            When(is_blocked=True, then=Value('Blocked')),
+            When(last_activity__isnull=True, then=Value('Inactive')),
+            When(last_activity__gt=now - ONLINE_WITHIN, then=Value('Online')),
+            When(last_activity__gt=now - AWAY_WITHIN, then=Value('Away')),
+            When(last_activity__lt=now - INACTIVE_AFTER, then=Value('Inactive')),
+            default=Value('Offline'),
+            output_field=models.CharField(),
+        ))
+
+    def filter_status(self, status, now=None):
+        return self.filter(status_q(status, now))
+
+    def status_counts(self, now=None):
+        now = now or timezone.now()
+        return self.aggregate(**{status: Count('id', filter=status_q(status, now)) for status in STATUSES})
+
 class CommonInfo(models.Model):
     GENDER_CHOICE = [
         ('Male', 'Male'),
@@ -17,6 +65,9 @@ class CommonInfo(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     date_of_birth = models.DateField()
     gender = models.CharField(max_length=50, choices=GENDER_CHOICE)
+    # Bumped when another profile of the same user is created or deleted,
+    # see profiles.py
+    role_version = models.PositiveIntegerField(default=0)
 
     def get_age(self):
         today = date.today()
@@ -27,25 +78,6 @@ class CommonInfo(models.Model):
             age -= 1
         return age
 
-    class Meta:
-        abstract = True
-
-class Staff(CommonInfo):
-    
-    Role_choice = [
-        ('Librarian', 'Librarian'),
-        ('Assistant Librarian', 'Assistant Librarian'),
-        ('Library Admin', 'Library Admin')
-    ]
-
-    lib_id = models.CharField(max_length=50, default='STF-')
-    hire_date = models.DateField(auto_now_add=True)
-    role = models.CharField(max_length=50, choices=Role_choice, default='Librarian')
-    is_blocked = models.BooleanField(default=False)
-    login_time =models.DateTimeField(null=True,blank=True)
-    last_activity = models.DateTimeField(null=True,blank=True)
-    
-
     @property
     def status(self):
         # If manually blocked
@@ -60,23 +92,44 @@ class Staff(CommonInfo):
         diff = now - self.last_activity
 
         # Online = active within last 5 minutes
-        if diff < timedelta(minutes=5):
+        if diff < ONLINE_WITHIN:
             return "Online"
 
         # Away = active within last 1 hour
-        if diff < timedelta(hours=1):
+        if diff < AWAY_WITHIN:
             return "Away"
 
-        # Offline = last seen within 24 hours
-        if diff < timedelta(days=1):
-            return "Offline"
-
         # Inactive = no activity for more than 30 days
-        if diff > timedelta(days=30):
+        if diff > INACTIVE_AFTER:
             return "Inactive"
 
+        # Offline = seen more than an hour ago but within the last 30 days
         return "Offline"
 
+    class Meta:
+        abstract = True
+
+class Staff(CommonInfo):
+    
+    Role_choice = [
+        ('Librarian', 'Librarian'),
+        ('Assistant Librarian', 'Assistant Librarian'),
+        ('Library Admin', 'Library Admin')
+    ]
+
+    lib_id = models.CharField(max_length=50, default='STF-')
+    hire_date = models.DateField(auto_now_add=True)
+    role = models.CharField(max_length=50, choices=Role_choice, default='Librarian')
+    is_blocked = models.BooleanField(default=False)
+    login_time =models.DateTimeField(null=True,blank=True)
+    last_activity = models.DateTimeField(null=True,blank=True)
+
+    objects = ProfileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_blocked', 'last_activity'], name='staff_status_idx'),
+        ]
     
     def __str__(self):
         return f'{self.user.first_name} {self.user.last_name}'
@@ -90,44 +143,25 @@ class Member(CommonInfo):
     is_blocked = models.BooleanField(default=False)
     last_activity = models.DateTimeField(null=True,blank=True)
     borrow_count = models.IntegerField(null=True,blank=True)
-    
-    @property
-    def status(self):
-        # If manually blocked
-        if self.is_blocked:  
-            return "Blocked"
-
-        # If user never logged in
-        if not self.last_activity:
-            return "Inactive"
-
-        now = timezone.now()
-        diff = now - self.last_activity
-
-        # Online = active within last 5 minutes
-        if diff < timedelta(minutes=5):
-            return "Online"
 
-        # Away = active within last 1 hour
-        if diff < timedelta(hours=1):
-            return "Away"
+    objects = ProfileQuerySet.as_manager()
 
-        # Offline = last seen within 24 hours
-        if diff < timedelta(days=1):
-            return "Offline"
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_blocked', 'last_activity'], name='member_status_idx'),
+        ]
+    
+    def loan_stats(self, today=None):
+        # Live and archived loans together, see archive.py
+        return finish_stats(BorrowRecord.objects.filter(borrower=self).stats_totals(today),
+                            ArchivedBorrowRecord.objects.filter(borrower=self).stats_totals(today))
 
-        # Inactive = no activity for more than 30 days
-        if diff > timedelta(days=30):
-            return "Inactive"
+    async def aloan_stats(self, today=None):
+        return finish_stats(await BorrowRecord.objects.filter(borrower=self).astats_totals(today),
+                            await ArchivedBorrowRecord.objects.filter(borrower=self).astats_totals(today))
 
-        return "Offline"
-    
     def average_borrow_days(self):
-        records = self.borrowrecord_set.filter(is_returned=True, borrow_duration__isnull=False)
-        if not records.exists():
-            return 0
-        total = sum(r.borrow_duration.days for r in records)
-        return total / len(records)
+        return self.loan_stats()['average_days']
 
     
     def __str__(self):
@@ -158,17 +192,108 @@ class Book(models.Model):
     Image = models.ImageField(upload_to='images/')
     ISBN = models.CharField(max_length=50, unique=True)
     Pages = models.IntegerField()
+    # Status is 'available' while copies_available > 0; both are changed
+    # together by the conditional UPDATEs in circulation.py
     Status = models.CharField(max_length=50, choices=STATUS_CHOICE, default='available')
+    copies_total = models.PositiveIntegerField(default=1)
+    copies_available = models.PositiveIntegerField(default=1)
     Genre = models.CharField(max_length=50, choices=Genre_CHOICE)
     Added_on = models.DateTimeField(auto_now_add=True)
     Updated_on = models.DateTimeField(auto_now=True)
+    # Content hash naming the thumbnails of Image, see thumbnails.py
+    Image_hash = models.CharField(max_length=16, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Default catalog listing: Status='available' ORDER BY Added_on DESC
+            models.Index(fields=['Status', 'Added_on'], name='book_status_added_idx'),
+            models.Index(fields=['Added_on'], name='book_added_idx'),
+            # Conditional GET of the catalog: MAX(Updated_on)
+            models.Index(fields=['Updated_on'], name='book_updated_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        book = super().from_db(db, field_names, values)
+        # Lets the post_save signal skip thumbnailing when the cover is unchanged
+        if 'Image' in field_names:
+            book._loaded_image = book.Image.name
+        return book
+
+    @property
+    def thumbnails(self):
+        # {size: {format: url}}; without thumbnails (not generated yet) the
+        # jpeg entries fall back to the original upload and webp is empty
+        original = self.Image.url if self.Image else ''
+        return {size: {'webp': thumbnail_url(self, size, 'webp'),
+                       'jpeg': thumbnail_url(self, size, 'jpeg') or original}
+                for size in SIZES}
     
     def __str__(self):
         return self.Title
 
+class BookCopy(models.Model):
+    # One physical copy of a title. Loans are counted against the title's
+    # copies_available, so copies only carry their barcode; see circulation.py.
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
+    barcode = models.CharField(max_length=60, unique=True)
+    Added_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'book copies'
+
+    def __str__(self):
+        return f'{self.book} ({self.barcode})'
+
+class BorrowRecordQuerySet(models.QuerySet):
+    def stats(self, today=None):
+        """Loan figures for the records in this queryset, in one aggregate query.
+
+        Returns a dict with open, returned, overdue (open and past due),
+        fined (records with a fine), total_fines and average_days (mean
+        duration of returned loans, 0 if there are none).
+        """
+        return finish_stats(self.stats_totals(today))
+
+    async def astats(self, today=None):
+        return finish_stats(await self.astats_totals(today))
+
+    def stats_totals(self, today=None):
+        # Sums and counts only, so the totals of several querysets (live and
+        # archived loans) can be added up by finish_stats
+        return self.aggregate(**self._stats_aggregates(today))
+
+    async def astats_totals(self, today=None):
+        return await self.aaggregate(**self._stats_aggregates(today))
+
+    def _stats_aggregates(self, today):
+        today = today or date.today()
+        is_open = Q(return_date__isnull=True)
+        has_duration = Q(is_returned=True, borrow_duration__isnull=False)
+        return {
+            'open': Count('id', filter=is_open),
+            'returned': Count('id', filter=~is_open),
+            'overdue': Count('id', filter=is_open & Q(due_date__lt=today)),
+            'fined': Count('id', filter=Q(fine__gt=0)),
+            'total_fines': Coalesce(Sum('fine'), 0),
+            'total_duration': Sum('borrow_duration', filter=has_duration),
+            'durations': Count('id', filter=has_duration),
+        }
+
+def finish_stats(*totals):
+    """Add up stats_totals() results into the dict BorrowRecordQuerySet.stats returns."""
+    stats = {key: sum(result[key] for result in totals)
+             for key in ('open', 'returned', 'overdue', 'fined', 'total_fines')}
+    durations = sum(result['durations'] for result in totals)
+    total_duration = sum((result['total_duration'] for result in totals if result['total_duration']), timedelta())
+    stats['average_days'] = total_duration / durations / timedelta(days=1) if durations else 0
+    return stats
+
 class BorrowRecord(models.Model):
-    book = models.ForeignKey(Book, on_delete=models.CASCADE)
-    borrower = models.ForeignKey(Member, on_delete=models.CASCADE)
+    # The composite indexes in Meta start with these columns, so the FKs do not
+    # need single-column indexes of their own
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
+    borrower = models.ForeignKey(Member, on_delete=models.CASCADE, db_index=False)
     borrow_date = models.DateField()
     return_date = models.DateField(null=True, blank=True)
     due_date = models.DateField()
@@ -176,6 +301,119 @@ class BorrowRecord(models.Model):
     is_overdue = models.BooleanField(default=False)
     fine = models.IntegerField(default=0)
     borrow_duration = models.DurationField(null=True,blank=True)
+    Updated_on = models.DateTimeField(auto_now=True)
+
+    objects = BorrowRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Member pages: a member's open / returned loans
+            models.Index(fields=['borrower', 'is_returned'], name='loan_borrower_returned_idx'),
+            models.Index(fields=['borrower', 'return_date'], name='loan_borrower_return_idx'),
+            # Conditional GET of the member pages: latest change to a member's loans
+            models.Index(fields=['borrower', 'Updated_on'], name='loan_borrower_updated_idx'),
+            # return_book: the member's open loan of one book
+            models.Index(fields=['book', 'borrower', 'is_returned'], name='loan_book_borrower_idx'),
+            # Dashboard and update_overdue: open loans by due date. Partial, so it
+            # only holds open loans; return_date is included to make it covering.
+            models.Index(fields=['return_date', 'due_date'], condition=models.Q(return_date__isnull=True),
+                         name='open_loan_due_idx'),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        record = super().from_db(db, field_names, values)
+        # Remember whether the loan was open when loaded, so the stats signals
+        # can tell a return apart from any other save
+        if 'return_date' in field_names:
+            record._loaded_open = record.return_date is None
+        return record
+
     def __str__(self):
         return f'{self.borrower} borrowed {self.book} on {self.borrow_date}'
+
+class ArchivedBorrowRecord(models.Model):
+    # Returned loans moved out of BorrowRecord by `manage.py archive_loans`,
+    # under the id they had there. Same columns, so both tables can be read
+    # with one UNION, see archive.py. An IntegerField key is INTEGER PRIMARY
+    # KEY on SQLite, the 64-bit rowid itself, so it needs no separate index.
+    id = models.IntegerField(primary_key=True)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    # Covered by the (borrower, borrow_date) index
+    borrower = models.ForeignKey(Member, on_delete=models.CASCADE, db_index=False)
+    borrow_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
+    due_date = models.DateField()
+    is_returned = models.BooleanField(default=True)
+    is_overdue = models.BooleanField(default=False)
+    fine = models.IntegerField(default=0)
+    borrow_duration = models.DurationField(null=True,blank=True)
+    Updated_on = models.DateTimeField()
+    archived_on = models.DateTimeField(auto_now_add=True)
+
+    objects = BorrowRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Member history, newest first (the id tiebreak comes with the index)
+            models.Index(fields=['borrower', 'borrow_date'], name='archived_loan_history_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.borrower} borrowed {self.book} on {self.borrow_date} (archived)'
+
+class Hold(models.Model):
+    # A member's place in the queue for a book that is out on loan. Positions
+    # only grow per book, so the head of the queue is the waiting hold with the
+    # lowest position. When the book comes back it is set aside for that
+    # member ('ready') until expires_on, see circulation.py.
+    STATUS_CHOICE = [
+        ('waiting', 'Waiting'),
+        ('ready', 'Ready for pickup'),
+        ('fulfilled', 'Fulfilled'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    ]
+    ACTIVE = ['waiting', 'ready']
+
+    # The (book, position) indexes in Meta cover lookups by book
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
+    member = models.ForeignKey(Member, on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICE, default='waiting')
+    placed_on = models.DateTimeField(auto_now_add=True)
+    expires_on = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'position'], name='hold_book_position_uniq'),
+            models.UniqueConstraint(fields=['book', 'member'], condition=models.Q(status__in=['waiting', 'ready']),
+                                    name='hold_one_active_per_member'),
+        ]
+        indexes = [
+            # Head of a book's queue. Partial, so finished holds never have to
+            # be skipped over.
+            models.Index(fields=['book', 'position'], condition=models.Q(status='waiting'), name='hold_queue_idx'),
+            # expire_holds: ready holds past their pickup date
+            models.Index(fields=['expires_on'], condition=models.Q(status='ready'), name='hold_ready_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.member} holds {self.book} (#{self.position}, {self.status})'
+
+class LibraryStats(models.Model):
+    # Single row (pk=1) of counters for the staff dashboard, kept current by
+    # the signals in signals.py and repaired by `manage.py reconcile_stats`.
+    # overdue_loans counts open loans with due_date < overdue_date.
+    total_books = models.IntegerField(default=0)
+    total_members = models.IntegerField(default=0)
+    active_loans = models.IntegerField(default=0)
+    overdue_loans = models.IntegerField(default=0)
+    overdue_date = models.DateField(null=True, blank=True)
+    Updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'library stats'
+
+    def __str__(self):
+        return f'{self.total_books} books, {self.total_members} members, {self.active_loans} active loans'
@@ -0,0 +1,126 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+# Keyset (cursor) pagination. Instead of OFFSET, each page remembers the sort
+# key of its first and last row and the next query continues from there with a
+# WHERE on the ordering columns, so page 1000 costs the same as page 1.
+#
+# `ordering` is a list like ['-Added_on', '-id']. The last entry must make the
+# order unique (normally the primary key) and none of the columns may be NULL.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, direction='next'):
+    raw = json.dumps({'v': values, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, queryset, ordering):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = data['v'], data['d']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor(cursor)
+
+    if direction not in ('next', 'prev') or len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+
+    opts = queryset.model._meta
+    try:
+        values = [opts.get_field(name.lstrip('-')).to_python(value)
+                  for name, value in zip(ordering, values)]
+    except Exception:
+        raise InvalidCursor(cursor)
+    return values, direction
+
+
+def _after(ordering, values, reverse=False):
+    # (a, b, c) > (x, y, z) spelled out for mixed sort directions:
+    # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    conditions = []
+    for i, name in enumerate(ordering):
+        field = name.lstrip('-')
+        descending = name.startswith('-') != reverse
+        q = Q(**{f'{field}__{"lt" if descending else "gt"}': values[i]})
+        for prev_name, prev_value in zip(ordering[:i], values[:i]):
+            q &= Q(**{prev_name.lstrip('-'): prev_value})
+        conditions.append(q)
+    return reduce(or_, conditions)
+
+
+def _key(obj, ordering):
+    if isinstance(obj, dict):
+        return [obj[name.lstrip('-')] for name in ordering]
+    return [getattr(obj, name.lstrip('-')) for name in ordering]
+
+
+class Page:
+    def __init__(self, items, ordering, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = encode_cursor(_key(items[-1], ordering), 'next') if has_next and items else None
+        self.previous_cursor = encode_cursor(_key(items[0], ordering), 'prev') if has_previous and items else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def paginate(queryset, ordering, cursor=None, per_page=24):
+    """Return one Page of `queryset` in `ordering`, starting at `cursor`.
+
+    Raises InvalidCursor if the cursor was not produced for this ordering.
+    """
+    return paginate_union([queryset], ordering, cursor, per_page)
+
+
+def paginate_union(querysets, ordering, cursor=None, per_page=24):
+    """paginate() over the rows of several querysets read as one UNION ALL.
+
+    The querysets must be values() querysets of the same columns, the
+    ordering columns among them, with no primary key in more than one.
+    """
+    direction = 'next'
+    condition = None
+    if cursor:
+        values, direction = decode_cursor(cursor, querysets[0], ordering)
+        condition = _after(ordering, values, reverse=direction == 'prev')
+
+    if direction == 'prev':
+        flipped = [name[1:] if name.startswith('-') else '-' + name for name in ordering]
+        rows = _fetch(querysets, condition, flipped, per_page + 1)
+        has_previous = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        return Page(items, ordering, has_next=True, has_previous=has_previous)
+
+    rows = _fetch(querysets, condition, ordering, per_page + 1)
+    return Page(rows[:per_page], ordering, has_next=len(rows) > per_page, has_previous=bool(cursor))
+
+
+def _fetch(querysets, condition, ordering, limit):
+    if condition is not None:
+        querysets = [queryset.filter(condition) for queryset in querysets]
+    if len(querysets) == 1:
+        return list(querysets[0].order_by(*ordering)[:limit])
+    # SQLite allows no LIMIT on the parts of a UNION, so each part is cut to
+    # `limit` rows through a pk IN (... LIMIT) subquery that walks its own
+    # index; the UNION then only sorts those few rows.
+    parts = [queryset.filter(pk__in=queryset.order_by(*ordering).values('pk')[:limit]) for queryset in querysets]
+    return list(parts[0].union(*parts[1:], all=True).order_by(*ordering)[:limit])
@@ -0,0 +1,20 @@
+from django.conf import settings
+
+# Per-connection SQLite tuning. Every new connection runs the PRAGMAs in
+# settings.SQLITE_PRAGMAS (see the connection_created receiver in
+# signals.py); with CONN_MAX_AGE a connection is reused across requests, so
+# this happens once per connection and not once per request.
+
+
+def apply_pragmas(connection, pragmas=None):
+    """Run `PRAGMA name = value` for each entry on `connection` and return
+    {name: value now in effect}."""
+    pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+    applied = {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            applied[name] = row[0] if row else None
+    return applied
@@ -0,0 +1,137 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.contrib import messages
+from django.db.models import F
+from django.shortcuts import redirect
+
+from .models import Member, Staff
+
+# Resolves the Staff/Member profile behind request.user once per request. The
+# role and profile pk are remembered in the session so later requests load the
+# profile with a single query. The entry carries the profile's role_version,
+# which is bumped in the database (see signals.py) on the user's other
+# profiles whenever one is created or deleted, so a role change is picked up
+# on the next request by every server process.
+
+SESSION_KEY = 'profile'
+ROLE_MODELS = {'staff': Staff, 'member': Member}
+
+
+def invalidate_role(user_id, exclude=None):
+    for model in ROLE_MODELS.values():
+        profiles = model.objects.filter(user_id=user_id)
+        if isinstance(exclude, model):
+            profiles = profiles.exclude(pk=exclude.pk)
+        profiles.update(role_version=F('role_version') + 1)
+
+
+def role_of(profile):
+    if isinstance(profile, Staff):
+        return 'staff'
+    if isinstance(profile, Member):
+        return 'member'
+    return None
+
+
+def remember_profile(request, profile):
+    if profile is None:
+        value = [None, None, None]
+    else:
+        value = [role_of(profile), profile.pk, profile.role_version]
+    # Assigned only on a change, so a user without a profile, who is looked
+    # up on every request, does not get their session saved every time
+    if request.session.get(SESSION_KEY) != value:
+        request.session[SESSION_KEY] = value
+    request._profile_cache = profile
+
+
+def _lookup(user_id):
+    staff = Staff.objects.select_related('user').filter(user_id=user_id).first()
+    if staff is not None:
+        return staff
+    return Member.objects.select_related('user').filter(user_id=user_id).first()
+
+
+def get_profile(request):
+    if hasattr(request, '_profile_cache'):
+        return request._profile_cache
+
+    if not request.user.is_authenticated:
+        request._profile_cache = None
+        return None
+    user_id = request.user.id
+
+    # A user without a profile has no row to carry a version, so they are
+    # looked up again on every request
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached[0] is not None:
+        role, pk, version = cached
+        profile = ROLE_MODELS[role].objects.select_related('user').filter(pk=pk, user_id=user_id).first()
+        if profile is not None and profile.role_version == version:
+            request._profile_cache = profile
+            return profile
+
+    profile = _lookup(user_id)
+    remember_profile(request, profile)
+    return profile
+
+
+def _attach(request):
+    request.profile = get_profile(request)
+    request.role = role_of(request.profile)
+
+
+def _check_login(request):
+    if not request.user.is_authenticated:
+        return redirect('/login/')
+    _attach(request)
+
+
+def _check_staff(request):
+    if not request.user.is_authenticated:
+        return redirect('/login/')
+    _attach(request)
+    if request.role != 'staff':
+        messages.error(request, 'Access denied. Staff only area.')
+        return redirect('/home/')
+
+
+def _check_member(request):
+    if not request.user.is_authenticated:
+        return redirect('/login/')
+    _attach(request)
+    if request.role == 'staff':
+        return redirect('/staff_dashboard/')
+    if request.role != 'member':
+        messages.error(request, 'Member profile not found.')
+        return redirect('/home/')
+
+
+def _guard(check):
+    # Works for both plain and async views. For async views the user and
+    # profile lookups still run synchronously, in one sync_to_async call.
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                denied = await sync_to_async(check)(request)
+                if denied is not None:
+                    return denied
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            denied = check(request)
+            if denied is not None:
+                return denied
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+login_required = _guard(_check_login)
+staff_required = _guard(_check_staff)
+member_required = _guard(_check_member)
@@ -0,0 +1,94 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+# Full-text search over Book.Title/Book.Author backed by an SQLite FTS5 table
+# (created in migration 0024). The FTS rowid is the Book id; rows are kept in
+# sync by the Book signals in signals.py and can be rebuilt from scratch with
+# `manage.py rebuild_search_index`. On other databases search falls back to a
+# plain icontains filter.
+
+FTS_TABLE = 'library_management_book_fts'
+RESULTS_PER_PAGE = 20
+
+# Title matches count for more than author matches in the bm25 ranking
+TITLE_WEIGHT = 10.0
+AUTHOR_WEIGHT = 5.0
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    # Quote every word so FTS5 operators in user input are taken literally and
+    # make each one a prefix match: "harry pot" -> "harry"* "pot"*
+    tokens = _TOKEN.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def index_book(book):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, Title, Author) VALUES (%s, %s, %s)',
+                       [book.pk, book.Title, book.Author])
+
+
+def unindex_book(book_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book_id])
+
+
+def index_books(books):
+    # Bulk variant for code paths that skip signals (bulk_create)
+    if not fts_enabled():
+        return
+    rows = [(book.pk, book.Title, book.Author) for book in books]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, Title, Author) VALUES (%s, %s, %s)', rows)
+
+
+def rebuild_index():
+    if not fts_enabled():
+        return 0
+    book_table = Book._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, Title, Author) '
+                       f'SELECT id, Title, Author FROM {book_table}')
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def search_books(query, page=1, per_page=RESULTS_PER_PAGE):
+    """Return (books, has_next) for one page of hits, best match first."""
+    expression = match_expression(query)
+    if not expression:
+        return [], False
+
+    offset = (page - 1) * per_page
+    if not fts_enabled():
+        books = list(Book.objects.filter(Q(Title__icontains=query) | Q(Author__icontains=query))
+                     .order_by('Title', 'id')[offset:offset + per_page + 1])
+        return books[:per_page], len(books) > per_page
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s OFFSET %s',
+            [expression, TITLE_WEIGHT, AUTHOR_WEIGHT, per_page + 1, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    books = Book.objects.in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books], has_next
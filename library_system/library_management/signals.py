@@ -0,0 +1,119 @@
+import logging
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from PIL import Image
+
+from . import stats
+from .circulation import new_copies
+from .models import Book, BookCopy, BorrowRecord, Member, Staff
+from .metrics import track_query
+from .pragmas import apply_pragmas
+from .profiles import invalidate_role
+from .search import index_book, unindex_book
+from .thumbnails import make_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_save, sender=Member)
+def profile_saved(sender, instance, created, **kwargs):
+    if created:
+        invalidate_role(instance.user_id, exclude=instance)
+
+
+@receiver(post_delete, sender=Staff)
+@receiver(post_delete, sender=Member)
+def profile_deleted(sender, instance, **kwargs):
+    invalidate_role(instance.user_id)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, update_fields=None, **kwargs):
+    # Status-only updates (borrow/return) do not touch the indexed columns
+    if update_fields is not None and not {'Title', 'Author'} & set(update_fields):
+        return
+    index_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    unindex_book(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+def book_counted(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(books=1)
+
+
+@receiver(post_save, sender=Book)
+def book_copies_created(sender, instance, created, **kwargs):
+    if created:
+        BookCopy.objects.bulk_create(new_copies(instance, instance.copies_total, numbered=0))
+
+
+@receiver(post_delete, sender=Book)
+def book_uncounted(sender, instance, **kwargs):
+    stats.adjust(books=-1)
+
+
+@receiver(post_save, sender=Member)
+def member_counted(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(members=1)
+
+
+@receiver(post_delete, sender=Member)
+def member_uncounted(sender, instance, **kwargs):
+    stats.adjust(members=-1)
+
+
+@receiver(post_save, sender=BorrowRecord)
+def loan_saved(sender, instance, created, **kwargs):
+    is_open = instance.return_date is None
+    was_open = False if created else getattr(instance, '_loaded_open', is_open)
+    if is_open != was_open:
+        stats.adjust(loans=1 if is_open else -1, loan_due=instance.due_date)
+    instance._loaded_open = is_open
+
+
+@receiver(post_delete, sender=BorrowRecord)
+def loan_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_loaded_open', instance.return_date is None):
+        stats.adjust(loans=-1, loan_due=instance.due_date)
+
+
+@receiver(post_save, sender=Book)
+def book_cover_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'Image' not in update_fields:
+        return
+    if not instance.Image:
+        return
+    if instance.Image_hash and getattr(instance, '_loaded_image', None) == instance.Image.name:
+        return
+    try:
+        image_hash = make_thumbnails(instance.Image.path)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # A broken upload should not fail the save; the pages fall back to
+        # the original image and the backfill command can retry later
+        logger.warning('Could not make thumbnails for book %s: %s', instance.pk, e)
+        return
+    # Updated_on is bumped too, it keys the cached book cards
+    updated_on = timezone.now()
+    Book.objects.filter(pk=instance.pk).update(Image_hash=image_hash, Updated_on=updated_on)
+    instance.Image_hash = image_hash
+    instance.Updated_on = updated_on
+    instance._loaded_image = instance.Image.name
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
+    # Count every query towards the request metrics (a no-op outside requests)
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_query)
@@ -897,7 +897,10 @@ function initHistoryPage() {
     const historyTableBody = document.getElementById('historyTableBody');
     if (!searchInput || !historyTableBody) return;
 
-    let historyList = new SearchableList({
+    // History is paginated on the server, so this only searches, filters and
+    // sorts the rows of the current page. The totals above the table come
+    // from the server and cover the whole history; they are left alone.
+    new SearchableList({
         container: historyTableBody,
         itemsSelector: '.history-row',
         searchInput: searchInput,
@@ -907,45 +910,16 @@ function initHistoryPage() {
         sortSelect: document.getElementById('sortFilter'),
         emptyStateElement: document.getElementById('noResultsMessage'),
         resultsCountElement: document.getElementById('resultsCount'),
-        searchFields: ['title', 'author'],
-        onUpdate: (visibleCount, visibleItems) => {
-            // Update stats
-            let totalFines = 0;
-            let returnedCount = 0;
-
-            visibleItems.forEach(row => {
-                const fine = parseFloat(row.dataset.fine) || 0;
-                totalFines += fine;
-                if (row.dataset.returnDate) {
-                    returnedCount++;
-                }
-            });
-
-            const totalFinesElement = document.getElementById('totalFinesAmount');
-            const returnedCountElement = document.getElementById('returnedCount');
-            if (totalFinesElement) totalFinesElement.textContent = totalFines;
-            if (returnedCountElement) returnedCountElement.textContent = returnedCount;
-        }
+        searchFields: ['title', 'author']
     });
 }
 
 function initBooksPage() {
-    const searchInput = document.getElementById('searchInput');
     const gridView = document.getElementById('gridView');
-    if (!searchInput || !gridView) return;
+    if (!gridView) return;
 
-    // Search and filter
-    let bookList = new SearchableList({
-        container: gridView,
-        itemsSelector: '.book-card',
-        searchInput: searchInput,
-        filters: {
-            genre: document.getElementById('genreFilter')
-        },
-        sortSelect: document.getElementById('sortFilter'),
-        emptyStateElement: document.querySelector('#gridView .empty-state'),
-        searchFields: ['title', 'author', 'genre']
-    });
+    // Search, filters and sorting are form fields handled by the server
+    // (catalog.py); filtering the cards here would contradict them.
 
     // View toggle
     if (document.getElementById('gridViewBtn') && document.getElementById('listViewBtn')) {
@@ -953,11 +927,7 @@ function initBooksPage() {
             gridView: gridView,
             listView: document.getElementById('listView'),
             gridBtn: document.getElementById('gridViewBtn'),
-            listBtn: document.getElementById('listViewBtn'),
-            onSwitch: () => {
-                // Update bookList items reference when view changes
-                bookList.items = Array.from(document.querySelectorAll('.book-card'));
-            }
+            listBtn: document.getElementById('listViewBtn')
         });
     }
 }
@@ -0,0 +1,90 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Book, BorrowRecord, LibraryStats, Member
+
+# The staff dashboard counters live in one LibraryStats row. Signals move the
+# counters with F() expressions, so concurrent writers never overwrite each
+# other. Code paths that skip signals (queryset.update(), bulk_create, raw SQL)
+# have to call adjust() themselves, or leave the drift to reconcile_stats.
+
+STATS_ID = 1
+
+
+def adjust(books=0, members=0, loans=0, loan_due=None):
+    """Add the given deltas to the stats row in a single UPDATE.
+
+    `loans` opens (+) or closes (-) loans due on `loan_due`; they are also
+    counted as overdue if that date is before the row's overdue_date.
+    """
+    changes = {}
+    if books:
+        changes['total_books'] = F('total_books') + books
+    if members:
+        changes['total_members'] = F('total_members') + members
+    if loans:
+        changes['active_loans'] = F('active_loans') + loans
+        if loan_due is not None:
+            changes['overdue_loans'] = F('overdue_loans') + Case(
+                When(overdue_date__gt=loan_due, then=Value(loans)),
+                default=Value(0), output_field=IntegerField())
+    if changes and not LibraryStats.objects.filter(pk=STATS_ID).update(**changes):
+        # No row yet: count everything, which already includes this change
+        reconcile()
+
+
+def count_overdue(today):
+    return BorrowRecord.objects.filter(return_date__isnull=True, due_date__lt=today).count()
+
+
+def current(today=None):
+    """The stats row, with overdue_loans brought forward to `today`.
+
+    Loans turn overdue as days pass without any write, so the first read of
+    the day recounts them (a range scan of the open-loan index) once.
+    """
+    today = today or date.today()
+    stats = LibraryStats.objects.filter(pk=STATS_ID).first()
+    if stats is None:
+        return reconcile(today)[0]
+    if stats.overdue_date != today:
+        LibraryStats.objects.filter(pk=STATS_ID).update(overdue_loans=count_overdue(today), overdue_date=today)
+        stats.refresh_from_db()
+    return stats
+
+
+async def acurrent(today=None):
+    today = today or date.today()
+    stats = await LibraryStats.objects.filter(pk=STATS_ID).afirst()
+    if stats is None or stats.overdue_date != today:
+        return await sync_to_async(current)(today)
+    return stats
+
+
+def reconcile(today=None):
+    """Recount every counter from the tables. Returns (stats, drift) where
+    drift maps each field that was off to its (stored, actual) values."""
+    today = today or date.today()
+    with transaction.atomic():
+        actual = {
+            'total_books': Book.objects.count(),
+            'total_members': Member.objects.count(),
+            'active_loans': BorrowRecord.objects.filter(return_date__isnull=True).count(),
+            'overdue_loans': count_overdue(today),
+            'overdue_date': today,
+        }
+        stats, created = LibraryStats.objects.select_for_update().get_or_create(pk=STATS_ID, defaults=actual)
+        drift = {}
+        if not created:
+            if stats.overdue_date != today:
+                # Counted as of another day, not comparable
+                stats.overdue_loans = actual['overdue_loans']
+            for field, value in actual.items():
+                if field != 'overdue_date' and getattr(stats, field) != value:
+                    drift[field] = (getattr(stats, field), value)
+                setattr(stats, field, value)
+            stats.save()
+    return stats, drift
@@ -1,3 +1,1151 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from contextlib import closing
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Value
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import stats
+from .activity import ActivityTracker
+from .archive import history_page
+from .async_views import available_books as async_available_books
+from .catalog import BOOKS_PER_PAGE
+from .conditional import books_state
+from .circulation import (AlreadyBorrowed, AlreadyOnHold, BookAvailable, BookUnavailable, CirculationBusy,
+                          LoanNotFound, add_copies, cancel_hold, checkin, checkout, expire_holds, place_hold)
+from .datagen import PASSWORD, generate, scale
+from .fines import compute_fine
+from .importer import clean_row, import_chunk
+from .metrics import Registry, RequestMetrics, registry
+from .management.commands.bench_views import CASES
+from .management.commands.import_books import Command as ImportBooksCommand
+from .models import ArchivedBorrowRecord, Book, BookCopy, BorrowRecord, Hold, LibraryStats, Member, Staff
+from .pragmas import apply_pragmas
+from .search import search_books
 
 # Create your tests here.
+
+# A plan step like "SCAN library_management_borrowrecord" with no index behind
+# it reads the whole table, unless the query has a LIMIT and the scan already
+# delivers rows in ORDER BY order (a keyset page walking the primary key).
+# Scans through an index or the FTS virtual table are fine.
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)$')
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+# Every read of the member pages, logged in as the member
+MEMBER_URLS = ['/home/', '/available_books/', '/my_books/', '/history/', '/fines/',
+               '/reservations/', '/settings/', '/search/?q=book']
+STAFF_URLS = ['/staff_dashboard/', '/manage_books/', '/manage_members/', '/settings/']
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        member_user = User.objects.create_user('member', password='pass')
+        staff_user = User.objects.create_user('staff', password='pass')
+        cls.member = Member.objects.create(user=member_user, gender='Male', date_of_birth=date(2000, 1, 1))
+        Staff.objects.create(user=staff_user, gender='Female', date_of_birth=date(1990, 1, 1))
+
+        today = date.today()
+        for i in range(5):
+            book = Book.objects.create(Title=f'Book {i}', Author='Author', Price=100, ISBN=f'isbn-{i}',
+                                       Pages=100, Genre='fiction', Image='images/cover.jpg')
+            BorrowRecord.objects.create(book=book, borrower=cls.member, borrow_date=today - timedelta(days=20),
+                                        due_date=today - timedelta(days=6 - i))
+            Hold.objects.create(book=book, member=cls.member, position=1)
+            ArchivedBorrowRecord.objects.create(id=1000 + i, book=book, borrower=cls.member,
+                                                borrow_date=today - timedelta(days=800),
+                                                due_date=today - timedelta(days=786),
+                                                return_date=today - timedelta(days=780), fine=60,
+                                                borrow_duration=timedelta(days=20), Updated_on=timezone.now())
+
+    def capture_plans(self, url):
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for sql, params in queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    def assertNoFullScans(self, url):
+        for sql, plan in self.capture_plans(url):
+            bounded = LIMIT.search(sql) and not any('TEMP B-TREE FOR ORDER BY' in step for step in plan)
+            scans = [step for step in plan if FULL_SCAN.match(step) and not bounded]
+            self.assertFalse(scans, f'{url} scans a whole table:\n{sql}\n' + '\n'.join(plan))
+
+    def test_member_pages_use_indexes(self):
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+        for url in MEMBER_URLS:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+    def test_staff_pages_use_indexes(self):
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        for url in STAFF_URLS:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+
+def make_member(username):
+    user = User.objects.create_user(username, password='pass')
+    return Member.objects.create(user=user, gender='Male', date_of_birth=date(2000, 1, 1))
+
+
+def updates(queries):
+    return [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+
+
+class ActivityTrackerTests(TestCase):
+    def setUp(self):
+        self.members = [make_member(f'member{i}') for i in range(3)]
+        self.tracker = ActivityTracker(granularity=60, flush_interval=3600, flush_size=3)
+        self.addCleanup(self.tracker.flush)
+
+    def test_flushes_when_buffer_is_full(self):
+        self.assertFalse(self.tracker.record(self.members[0].user_id))
+        self.assertFalse(self.tracker.record(self.members[1].user_id))
+        self.assertTrue(self.tracker.record(self.members[2].user_id))
+
+    def test_flushes_after_interval(self):
+        self.assertFalse(self.tracker.record(self.members[0].user_id))
+        self.tracker._last_flush -= 3600
+        self.assertTrue(self.tracker.record(self.members[0].user_id))
+
+    def test_coalesces_within_granularity(self):
+        now = timezone.now()
+        self.tracker.record(self.members[0].user_id, now)
+        self.tracker.record(self.members[0].user_id, now + timedelta(seconds=30))
+        self.assertEqual(self.tracker.pending(), {self.members[0].user_id: now})
+
+    def test_flush_is_one_update(self):
+        now = timezone.now()
+        for member in self.members:
+            self.tracker.record(member.user_id, now)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.tracker.flush(), 3)
+        self.assertEqual(len(updates(queries)), 1)
+        self.assertEqual(Member.objects.filter(last_activity=now).count(), 3)
+        self.assertEqual(self.tracker.pending(), {})
+
+
+class ActivityTimerTests(TransactionTestCase):
+    def test_quiet_worker_flushes_on_timer(self):
+        member = make_member('member')
+        tracker = ActivityTracker(granularity=60, flush_interval=0.05, flush_size=100)
+        self.assertFalse(tracker.record(member.user_id))
+        # No further record() call; only the timer can write it back
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            member.refresh_from_db()
+            if member.last_activity:
+                break
+            time.sleep(0.05)
+        self.assertIsNotNone(member.last_activity)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProfileRoleTests(TestCase):
+    def setUp(self):
+        self.member = make_member('member')
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+    def test_role_change_is_stored_in_the_database(self):
+        self.assertRedirects(self.client.get('/staff_dashboard/'), '/home/', fetch_redirect_response=False)
+        Staff.objects.create(user=self.member.user, gender='Male', date_of_birth=date(2000, 1, 1))
+        # Seen by any process, nothing is kept in the local cache
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.role_version, 1)
+        self.assertEqual(self.client.get('/staff_dashboard/').status_code, 200)
+
+    def test_deleted_profile_is_not_used(self):
+        self.assertEqual(self.client.get('/my_books/').status_code, 200)
+        self.member.delete()
+        self.assertRedirects(self.client.get('/my_books/'), '/home/', fetch_redirect_response=False)
+
+    def test_user_without_profile_does_not_rewrite_the_session(self):
+        User.objects.create_superuser('admin', password='pass')
+        self.client.post('/login/', {'username': 'admin', 'loginpwd': 'pass'})
+        self.client.get('/home/')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/home/').status_code, 200)
+        self.assertEqual(updates([q for q in queries.captured_queries if 'django_session' in q['sql']]), [])
+
+
+def make_book(title, **fields):
+    fields = dict(dict(Author='Author', Price=100, ISBN=title, Pages=100, Genre='fiction'), **fields)
+    return Book.objects.create(Title=title, **fields)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_member('member')
+        for i in range(BOOKS_PER_PAGE * 2):
+            make_book(f'Book {i:02}', Genre='fiction' if i % 3 else 'history')
+
+    def setUp(self):
+        cache.clear()
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+    def titles(self, response):
+        return [book.Title for book in response.context['books']]
+
+    def test_filters_sorts_and_pages_on_the_server(self):
+        fiction = sorted(Book.objects.filter(Genre='fiction').values_list('Title', flat=True), reverse=True)
+        first = self.client.get('/available_books/', {'genre': 'fiction', 'sort': 'title-desc'})
+        self.assertEqual(first.context['total'], len(fiction))
+        page = first.context['page']
+        second = self.client.get('/available_books/', {'genre': 'fiction', 'sort': 'title-desc',
+                                                       'cursor': page.next_cursor})
+        self.assertEqual(self.titles(first) + self.titles(second), fiction)
+
+    def test_total_is_counted_once_per_filter_set(self):
+        first = self.client.get('/available_books/', {'sort': 'title-asc'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/available_books/', {'sort': 'title-asc', 'cursor': first.context['page'].next_cursor})
+        self.assertFalse([q for q in queries if '__count' in q['sql']])
+        history = self.client.get('/available_books/', {'genre': 'history'})
+        self.assertEqual(history.context['total'], Book.objects.filter(Genre='history').count())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dune = make_book('Dune', Author='Frank Herbert')
+        cls.herbert = make_book('A Life', Author='Dune Herbert')
+        make_book('Emma', Author='Jane Austen')
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'FTS5 is SQLite specific')
+    def test_title_matches_rank_first(self):
+        books, has_next = search_books('dun')
+        self.assertEqual(books, [self.dune, self.herbert])
+        self.assertFalse(has_next)
+        self.assertEqual(search_books('austen jan')[0][0].Title, 'Emma')
+
+    def test_fallback_matches_title_and_author(self):
+        with mock.patch('library_management.search.fts_enabled', return_value=False):
+            books, has_next = search_books('herbert')
+        self.assertEqual(books, [self.herbert, self.dune])
+
+
+class CirculationTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_member('alice'), make_member('bob')
+        self.book = make_book('Dune')
+
+    def assertCopies(self, available, status):
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available, self.book.Status), (available, status))
+
+    def test_last_copy_is_lent_once(self):
+        checkout(self.book.id, self.alice)
+        with self.assertRaises(BookUnavailable):
+            checkout(self.book.id, self.bob)
+        self.assertCopies(0, 'unavailable')
+        self.assertEqual(BorrowRecord.objects.filter(book=self.book).count(), 1)
+
+    def test_second_copy_of_a_title_is_refused(self):
+        Book.objects.filter(id=self.book.id).update(copies_total=2, copies_available=2)
+        checkout(self.book.id, self.alice)
+        with self.assertRaises(AlreadyBorrowed):
+            checkout(self.book.id, self.alice)
+        # The copy claimed by the refused checkout is back on the shelf
+        self.assertCopies(1, 'available')
+
+    def test_locked_database_is_busy(self):
+        locked = OperationalError('database is locked')
+        with mock.patch.object(BorrowRecord.objects, 'create', side_effect=locked):
+            with self.assertRaises(CirculationBusy):
+                checkout(self.book.id, self.alice)
+        self.assertCopies(1, 'available')
+
+    def test_return_puts_the_copy_back_and_fines(self):
+        today = date.today()
+        checkout(self.book.id, self.alice, today=today - timedelta(days=20))
+        with self.assertRaises(LoanNotFound):
+            checkin(self.book.id, self.bob)
+        record = checkin(self.book.id, self.alice, today=today)
+        self.assertTrue(record.is_returned)
+        self.assertEqual(record.fine, 60)
+        self.assertCopies(1, 'available')
+
+
+class MakeThumbnailsTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media_settings = override_settings(MEDIA_ROOT=self.media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def cover(self, title, name, size=None, data=None):
+        with open(f'{self.media}/{name}', 'wb') as f:
+            if size:
+                Image.new('RGB', size, 'red').save(f, 'PNG')
+            else:
+                f.write(data)
+        book = make_book(title)
+        Book.objects.filter(id=book.id).update(Image=name)
+        return book
+
+    def test_bad_covers_do_not_stop_the_run(self):
+        good = self.cover('Good', 'good.png', size=(10, 10))
+        broken = self.cover('Broken', 'broken.jpg', data=b'not an image')
+        bomb = self.cover('Bomb', 'bomb.png', size=(40, 40))
+        later = self.cover('Later', 'later.png', size=(8, 8))
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            call_command('make_thumbnails', workers=2, batch_size=2, stdout=out, stderr=err)
+        self.assertIn('Thumbnailed 2 covers', out.getvalue())
+        self.assertIn('2 failed', out.getvalue())
+        hashes = dict(Book.objects.values_list('id', 'Image_hash'))
+        self.assertTrue(hashes[good.id] and hashes[later.id])
+        self.assertEqual((hashes[broken.id], hashes[bomb.id]), ('', ''))
+        self.assertIn(f'Book {bomb.id}', err.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class HoldQueueTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol, self.dave = [make_member(name) for name in ('alice', 'bob', 'carol', 'dave')]
+        self.book = make_book('Dune')
+        checkout(self.book.id, self.alice)
+
+    def status(self, hold):
+        hold.refresh_from_db()
+        return hold.status
+
+    def test_positions_follow_the_last_one(self):
+        with self.assertRaises(BookAvailable):
+            place_hold(make_book('Emma').id, self.bob)
+        first = place_hold(self.book.id, self.bob)
+        second = place_hold(self.book.id, self.carol)
+        cancel_hold(first.id, self.bob)
+        third = place_hold(self.book.id, self.dave)
+        self.assertEqual([first.position, second.position, third.position], [1, 2, 3])
+
+    def test_one_active_hold_per_member(self):
+        place_hold(self.book.id, self.bob)
+        with self.assertRaises(AlreadyOnHold):
+            place_hold(self.book.id, self.bob)
+        with self.assertRaises(AlreadyOnHold):
+            place_hold(self.book.id, self.alice)
+        self.assertEqual(Hold.objects.filter(book=self.book).count(), 1)
+
+    def test_position_collision_is_busy(self):
+        place_hold(self.book.id, self.bob)
+        # As if carol's INSERT had read the queue before bob's was committed
+        with mock.patch('library_management.circulation.Subquery', return_value=Value(0)):
+            with self.assertRaises(CirculationBusy):
+                place_hold(self.book.id, self.carol)
+        self.assertEqual(place_hold(self.book.id, self.carol).position, 2)
+
+    def test_return_goes_to_the_head_of_the_queue(self):
+        bob = place_hold(self.book.id, self.bob)
+        carol = place_hold(self.book.id, self.carol)
+        checkin(self.book.id, self.alice)
+        self.assertEqual((self.status(bob), self.status(carol)), ('ready', 'waiting'))
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available, self.book.Status), (0, 'unavailable'))
+        with self.assertRaises(BookUnavailable):
+            checkout(self.book.id, self.dave)
+
+        checkout(self.book.id, self.bob)
+        self.assertEqual(self.status(bob), 'fulfilled')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.copies_available, 0)
+
+    def test_cancelled_ready_hold_passes_the_copy_on(self):
+        bob = place_hold(self.book.id, self.bob)
+        carol = place_hold(self.book.id, self.carol)
+        checkin(self.book.id, self.alice)
+        cancel_hold(bob.id, self.bob)
+        self.assertEqual((self.status(bob), self.status(carol)), ('cancelled', 'ready'))
+
+    def test_expired_holds_pass_the_copy_on(self):
+        today = date.today()
+        bob = place_hold(self.book.id, self.bob)
+        carol = place_hold(self.book.id, self.carol)
+        checkin(self.book.id, self.alice, today=today - timedelta(days=10))
+        self.assertEqual(expire_holds(today), 1)
+        self.assertEqual((self.status(bob), self.status(carol)), ('expired', 'ready'))
+        # Nobody left in line, the copy goes back on the shelf
+        self.assertEqual(expire_holds(today + timedelta(days=10)), 1)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available, self.book.Status), (1, 'available'))
+
+    def test_reservations_count_the_queue_in_one_query(self):
+        for member in (self.bob, self.carol):
+            place_hold(self.book.id, member)
+        for title in ('Emma', 'Ulysses'):
+            other = make_book(title)
+            checkout(other.id, self.alice)
+            place_hold(other.id, self.carol)
+            place_hold(other.id, self.dave)
+        self.client.post('/login/', {'username': 'dave', 'loginpwd': 'pass'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/reservations/')
+        self.assertEqual([hold.ahead for hold in response.context['holds']], [1, 1])
+        self.assertEqual(len([q for q in queries if 'library_management_hold' in q['sql']]), 1)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'checks the FTS table')
+class FoldTitlesMigrationTests(TransactionTestCase):
+    before = [('library_management', '0029_holds')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate, executor.loader.graph.leaf_nodes())
+        self.apps = self.migrate(self.before)
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_duplicate_titles_are_folded(self):
+        apps = self.apps
+        HistoricalBook = apps.get_model('library_management', 'Book')
+        HistoricalHold = apps.get_model('library_management', 'Hold')
+        HistoricalRecord = apps.get_model('library_management', 'BorrowRecord')
+        members = [apps.get_model('library_management', 'Member').objects.create(
+                       user=apps.get_model('auth', 'User').objects.create(username=f'member{i}'),
+                       date_of_birth=date(2000, 1, 1), gender='Male')
+                   for i in range(5)]
+
+        def book(title, author, isbn, status):
+            return HistoricalBook.objects.create(Title=title, Author=author, ISBN=isbn, Status=status,
+                                                 Price=1, Pages=1, Genre='fiction', Image='')
+
+        def hold(book, member, position, status='waiting'):
+            HistoricalHold.objects.create(book=book, member=members[member], position=position, status=status)
+
+        today = date.today()
+        dune = book('Dune', 'Frank Herbert', 'a1', 'unavailable')
+        dune2 = book('dune ', 'frank  herbert', 'a2', 'unavailable')
+        book('DUNE', 'Frank Herbert', 'a3', 'available')
+        other = book('Other', 'X', 'o1', 'unavailable')
+        emma = book('Emma', 'Jane Austen', 'e1', 'unavailable')
+        emma2 = book('Emma', 'Jane Austen', 'e2', 'unavailable')
+        for loan_book, member in ((dune, 0), (dune2, 1), (other, 0), (emma, 4)):
+            HistoricalRecord.objects.create(book=loan_book, borrower=members[member], borrow_date=today,
+                                            due_date=today)
+        hold(dune, 2, 1)
+        hold(dune2, 2, 1)
+        hold(other, 0, 1)
+        # emma2's copy is set aside for member 3, who also waits for emma
+        hold(emma, 3, 1)
+        hold(emma2, 3, 1, 'ready')
+        hold(emma2, 1, 2)
+        apps.get_model('library_management', 'LibraryStats').objects.update_or_create(
+            pk=1, defaults={'total_books': 6})
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM library_management_book_fts')
+            cursor.execute('INSERT INTO library_management_book_fts (rowid, Title, Author) '
+                           'SELECT id, Title, Author FROM library_management_book')
+
+        self.migrate([('library_management', '0030_book_copies')])
+        self.assertEqual(set(Book.objects.values_list('id', flat=True)), {dune.id, other.id, emma.id})
+        counters = {book.id: (book.copies_total, book.copies_available, book.Status) for book in Book.objects.all()}
+        self.assertEqual(counters, {dune.id: (3, 0, 'unavailable'), other.id: (1, 0, 'unavailable'),
+                                    emma.id: (2, 0, 'unavailable')})
+        self.assertEqual(sorted(BookCopy.objects.filter(book_id=dune.id).values_list('barcode', flat=True)),
+                         ['a1', 'a2', 'a3'])
+        self.assertEqual(BorrowRecord.objects.filter(book_id=dune.id).count(), 2)
+
+        def queue(book):
+            return list(Hold.objects.filter(book_id=book.id).order_by('position')
+                        .values_list('member__user__username', 'status'))
+        # The shelf copy went to the waiting member, the duplicate hold was cancelled
+        self.assertEqual(queue(dune), [('member2', 'ready'), ('member2', 'cancelled')])
+        # The copy set aside for the cancelled ready hold was handed on, not lost
+        self.assertEqual(queue(emma), [('member3', 'ready'), ('member3', 'cancelled'), ('member1', 'waiting')])
+
+        self.assertEqual(LibraryStats.objects.get(pk=1).total_books, 3)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rowid FROM library_management_book_fts ORDER BY rowid')
+            self.assertEqual([row[0] for row in cursor.fetchall()], sorted([dune.id, other.id, emma.id]))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BookCopyTests(TestCase):
+    def setUp(self):
+        # Dune was folded from two rows, 978-1 lives on as a barcode only
+        self.dune = make_book('Dune', ISBN='978-0', copies_total=2, copies_available=2)
+        BookCopy.objects.filter(barcode='978-0-2').update(barcode='978-1')
+
+    def barcodes(self, book):
+        return sorted(book.copies.values_list('barcode', flat=True))
+
+    def test_new_copies_skip_barcodes_in_use(self):
+        BookCopy.objects.filter(book=make_book('Ulysses')).update(barcode='978-2-2')
+        emma = make_book('Emma', ISBN='978-2', copies_total=3, copies_available=3)
+        self.assertEqual(self.barcodes(emma), ['978-2', '978-2-3', '978-2-4'])
+        add_copies(self.dune, 1)
+        self.assertEqual(self.barcodes(self.dune), ['978-0', '978-0-3', '978-1'])
+
+    def test_add_book_with_an_isbn_used_as_barcode(self):
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        self.client.post('/add_book/', {'title': 'Emma', 'author': 'Jane Austen', 'isbn': '978-1',
+                                        'published_date': '2020-01-01', 'genre': 'fiction', 'price': 1,
+                                        'pages': 2, 'copies': 2})
+        emma = Book.objects.get(ISBN='978-1')
+        self.assertEqual((emma.copies_total, emma.copies_available), (2, 2))
+        self.assertEqual(self.barcodes(emma), ['978-1-2', '978-1-3'])
+
+    def test_import_skips_isbns_used_as_barcodes(self):
+        rows = [{'title': title, 'author': 'A', 'isbn': isbn, 'price': '1', 'pages': '2', 'genre': 'fiction'}
+                for title, isbn in (('Dune', '978-1'), ('Emma', '978-2'))]
+        self.assertEqual(import_chunk([clean_row(row) for row in rows]), (1, 1))
+        self.assertEqual(self.barcodes(Book.objects.get(ISBN='978-2')), ['978-2'])
+
+    def edit_dune(self, copies):
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        response = self.client.post(f'/edit_book/{self.dune.id}', {
+            'title': 'Dune Messiah', 'author': 'Frank Herbert', 'isbn': '978-0', 'published_date': '2020-01-01',
+            'genre': 'fiction', 'price': 1, 'pages': 2, 'copies': copies})
+        self.dune.refresh_from_db()
+        return response, [str(message) for message in response.wsgi_request._messages]
+
+    def test_edit_book_with_a_bad_number_of_copies(self):
+        response, messages = self.edit_dune('two')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(messages, ['Number of copies must be a whole number.'])
+        self.assertEqual((self.dune.Title, self.dune.copies_total), ('Dune', 2))
+
+    def test_edit_book_reports_only_the_copies_error(self):
+        for name in ('alice', 'bob'):
+            checkout(self.dune.id, make_member(name))
+        _, messages = self.edit_dune(1)
+        self.assertEqual(len(messages), 1)
+        self.assertIn('saved, but only copies on the shelf can be withdrawn', messages[0])
+        self.assertEqual((self.dune.Title, self.dune.copies_total), ('Dune Messiah', 2))
+
+    def test_edit_book_changes_the_current_number_of_copies(self):
+        _, messages = self.edit_dune(3)
+        self.assertEqual(messages, ['Book "Dune Messiah" updated successfully.'])
+        self.assertEqual((self.dune.copies_total, self.dune.copies_available), (3, 3))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.member = make_member('member')
+        today = date.today()
+        books = [make_book(f'Book {i}') for i in range(5)]
+        # Three loans returned long ago, one recently, one still open
+        for i, days_ago in enumerate([900, 800, 700, 30, 5]):
+            borrowed = today - timedelta(days=days_ago)
+            returned = borrowed + timedelta(days=20) if i < 4 else None
+            BorrowRecord.objects.create(book=books[i], borrower=self.member, borrow_date=borrowed,
+                                        due_date=borrowed + timedelta(days=14), return_date=returned,
+                                        is_returned=returned is not None, fine=60 if returned else 0,
+                                        borrow_duration=returned - borrowed if returned else None)
+        self.history = list(BorrowRecord.objects.order_by('-borrow_date', '-id').values_list('id', flat=True))
+        self.stats = self.member.loan_stats()
+
+    def test_old_returned_loans_move_and_stay_visible(self):
+        call_command('archive_loans', days=365, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(sorted(ArchivedBorrowRecord.objects.values_list('id', flat=True)), sorted(self.history[2:]))
+        self.assertEqual(BorrowRecord.objects.count(), 2)
+        self.assertEqual(self.member.loan_stats(), self.stats)
+
+        page = history_page(self.member, per_page=3)
+        rest = history_page(self.member, page.next_cursor, per_page=3)
+        self.assertEqual([record.id for record in [*page, *rest]], self.history)
+
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+        self.assertContains(self.client.get('/history/'), 'of 5 records')
+        loans = json.loads(self.client.get('/api/v1/loans/').content)
+        self.assertEqual([item['id'] for item in loans['items']], self.history)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'rowid tables are SQLite specific')
+    def test_archive_key_is_the_rowid(self):
+        table = ArchivedBorrowRecord._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE tbl_name = %s AND name LIKE 'sqlite_autoindex%%'",
+                           [table])
+            self.assertEqual(cursor.fetchall(), [])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class PragmaTests(TestCase):
+    def test_new_connections_are_tuned(self):
+        connection.close()
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            for name in ('synchronous', 'busy_timeout', 'cache_size', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                # synchronous NORMAL is 1, temp_store MEMORY is 2
+                expected = {'synchronous': 1, 'temp_store': 2}.get(name, settings.SQLITE_PRAGMAS[name])
+                self.assertEqual(cursor.fetchone()[0], expected, name)
+
+    def test_wal_on_a_file_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        raw = sqlite3.connect(f'{directory}/wal.sqlite3')
+        self.addCleanup(raw.close)
+        # apply_pragmas only needs connection.cursor() as a context manager
+        applied = apply_pragmas(SimpleNamespace(cursor=lambda: closing(raw.cursor())))
+        self.assertEqual(applied['journal_mode'], 'wal')
+        self.assertEqual(applied['busy_timeout'], 5000)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ManageMembersTests(TestCase):
+    def setUp(self):
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        self.book = make_book('Dune', copies_total=30, copies_available=30)
+
+    def add_members(self, count, loans):
+        for i in range(count):
+            member = make_member(f'member{Member.objects.count()}')
+            for _ in range(loans if i % 2 else 0):
+                BorrowRecord.objects.create(book=self.book, borrower=member, borrow_date=date.today(),
+                                            due_date=date.today())
+
+    def get_pages(self):
+        members, cursor = [], None
+        while True:
+            response = self.client.get('/manage_members/', {'cursor': cursor} if cursor else {})
+            members += response.context['members']
+            cursor = response.context['page'].next_cursor
+            if not response.context['page'].has_next:
+                return response, members
+
+    def test_open_loans_are_counted_without_a_query_per_member(self):
+        self.add_members(4, loans=2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/manage_members/')
+        self.add_members(30, loans=1)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get('/manage_members/')
+        self.assertEqual(len(many), len(few))
+        response, members = self.get_pages()
+        self.assertEqual(response.context['total'], 34)
+        self.assertEqual([member.id for member in members], sorted(Member.objects.values_list('id', flat=True)))
+        expected = {member.id: member.borrowrecord_set.filter(is_returned=False).count()
+                    for member in Member.objects.all()}
+        self.assertEqual({member.id: member.open_loans for member in members}, expected)
+
+class MemberStatusTests(TestCase):
+    def test_sql_status_matches_the_property(self):
+        now = timezone.now()
+        seen = {'Online': now - timedelta(minutes=1), 'Away': now - timedelta(minutes=30),
+                'Offline': now - timedelta(hours=2), 'Inactive': now - timedelta(days=40)}
+        for status, last_activity in seen.items():
+            Member.objects.filter(id=make_member(status).id).update(last_activity=last_activity)
+        Member.objects.filter(id=make_member('never').id).update(last_activity=None)
+        Member.objects.filter(id=make_member('Blocked').id).update(is_blocked=True, last_activity=now)
+
+        for member in Member.objects.with_status(now):
+            self.assertEqual(member.activity_status, member.status, member.user.username)
+        for status in ('Online', 'Away', 'Offline', 'Blocked'):
+            self.assertEqual([m.user.username for m in Member.objects.filter_status(status, now)], [status])
+        self.assertEqual(Member.objects.status_counts(now),
+                         {'Online': 1, 'Away': 1, 'Offline': 1, 'Inactive': 2, 'Blocked': 1})
+
+
+class UpdateOverdueTests(TestCase):
+    def test_fines_follow_the_due_date(self):
+        today = date(2026, 3, 1)
+        member = make_member('member')
+        books = [make_book(f'Book {i}') for i in range(5)]
+
+        def loan(book, due, **fields):
+            return BorrowRecord.objects.create(book=book, borrower=member, borrow_date=due - timedelta(days=14),
+                                               due_date=due, **fields)
+        late = [loan(books[0], today - timedelta(days=3)), loan(books[1], today - timedelta(days=3)),
+                loan(books[2], today - timedelta(days=1))]
+        # Due date pushed back after it had been fined
+        extended = loan(books[3], today + timedelta(days=7), is_overdue=True, fine=50)
+        returned = loan(books[4], today - timedelta(days=9), return_date=today - timedelta(days=2),
+                        is_returned=True, fine=70)
+
+        out = io.StringIO()
+        call_command('update_overdue', date=today, chunk_size=2, stdout=out)
+        self.assertIn('Updated 4 loans', out.getvalue())
+        fines = dict(BorrowRecord.objects.values_list('id', 'fine'))
+        self.assertEqual([fines[record.id] for record in late], [30, 30, 10])
+        self.assertEqual((fines[extended.id], fines[returned.id]), (0, 70))
+        self.assertTrue(all(BorrowRecord.objects.filter(id__in=[r.id for r in late]).values_list('is_overdue', flat=True)))
+
+        # Nothing left to change on the same day
+        call_command('update_overdue', date=today, stdout=out)
+        self.assertIn('Updated 0 loans', out.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LibraryStatsTests(TestCase):
+    def test_signals_keep_the_counters(self):
+        today = date.today()
+        stats.reconcile(today)
+        alice, bob = make_member('alice'), make_member('bob')
+        dune, emma, spare = make_book('Dune'), make_book('Emma'), make_book('Spare')
+        checkout(dune.id, alice, today=today - timedelta(days=30))
+        checkout(emma.id, bob)
+        checkin(emma.id, bob)
+        checkout(emma.id, alice)
+        spare.delete()
+        make_member('carol').delete()
+
+        current = stats.current(today)
+        self.assertEqual((current.total_books, current.total_members, current.active_loans, current.overdue_loans),
+                         (2, 2, 2, 1))
+        self.assertEqual(stats.reconcile(today)[1], {})
+
+    def test_dashboard_reads_one_row(self):
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+        make_book('Dune')
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        self.client.get('/staff_dashboard/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/staff_dashboard/')
+        self.assertEqual(response.context['total_books'], 1)
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql']])
+
+
+class ImportBooksTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = f'{directory}/books.csv'
+        make_book('Old', ISBN='isbn-0')
+        rows = ['title,author,isbn,price,pages,genre,copies',
+                'Dune,Frank Herbert,isbn-1,10,400,Fiction,2',
+                'Dune again,Frank Herbert,isbn-1,10,400,fiction,1',
+                'Old,Someone,isbn-0,10,100,fiction,1',
+                ',No Title,isbn-2,10,100,fiction,1',
+                'Emma,Jane Austen,isbn-3,12,300,fiction,1']
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(rows) + '\n')
+
+    def test_rows_are_validated_deduplicated_and_indexed(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_books', self.path, chunk_size=2, stdout=out, stderr=err)
+        self.assertIn('2 books added, 2 duplicate ISBNs and 1 invalid rows skipped', out.getvalue())
+        self.assertIn('line 5: missing Title', err.getvalue())
+        dune = Book.objects.get(ISBN='isbn-1')
+        self.assertEqual((dune.Title, dune.copies_total, dune.copies.count()), ('Dune', 2, 2))
+        self.assertEqual(stats.current().total_books, 3)
+        if connection.vendor == 'sqlite':
+            self.assertEqual(search_books('austen')[0], [Book.objects.get(ISBN='isbn-3')])
+
+    def write_progress(self, rows):
+        with open(self.path + '.progress', 'w') as f:
+            json.dump({'source': ImportBooksCommand().source(self.path), 'rows': rows}, f)
+
+    def test_resume_skips_committed_rows(self):
+        self.write_progress(4)
+        call_command('import_books', self.path, resume=True, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(sorted(Book.objects.values_list('ISBN', flat=True)), ['isbn-0', 'isbn-3'])
+
+    def test_resume_refuses_a_changed_file(self):
+        self.write_progress(4)
+        with open(self.path, 'a') as f:
+            f.write('Ulysses,James Joyce,isbn-4,15,700,fiction,1\n')
+        with self.assertRaisesMessage(CommandError, 'different or changed input file'):
+            call_command('import_books', self.path, resume=True, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(list(Book.objects.values_list('ISBN', flat=True)), ['isbn-0'])
+
+
+class LoanStatsTests(TestCase):
+    def test_stats_are_aggregated_in_sql(self):
+        today = date.today()
+        member, other = make_member('member'), make_member('other')
+        books = [make_book(f'Book {i}') for i in range(5)]
+
+        def loan(book, borrower, borrowed_ago, days=None, fine=0, due_in=14):
+            borrowed = today - timedelta(days=borrowed_ago)
+            returned = borrowed + timedelta(days=days) if days is not None else None
+            BorrowRecord.objects.create(book=book, borrower=borrower, borrow_date=borrowed,
+                                        due_date=borrowed + timedelta(days=due_in), return_date=returned,
+                                        is_returned=returned is not None, fine=fine,
+                                        borrow_duration=timedelta(days=days) if days is not None else None)
+        loan(books[0], member, 60, days=4)
+        loan(books[1], member, 40, days=10, fine=30)
+        loan(books[2], member, 20)
+        loan(books[3], member, 2)
+        loan(books[4], other, 50, days=30, fine=160)
+
+        with self.assertNumQueries(2):
+            loan_stats = member.loan_stats(today)
+        self.assertEqual(loan_stats, {'open': 2, 'returned': 2, 'overdue': 1, 'fined': 1, 'total_fines': 30,
+                                      'average_days': 7.0})
+        self.assertEqual(make_member('new').loan_stats(today)['average_days'], 0)
+
+
+class DatagenTests(TestCase):
+    today = date(2026, 3, 1)
+
+    def snapshot(self):
+        return (list(Book.objects.order_by('id').values_list('Title', 'Author', 'Genre', 'Status')),
+                sorted(BorrowRecord.objects.values_list('book__Title', 'borrower__user__username',
+                                                        'borrow_date', 'return_date', 'fine')))
+
+    def test_same_seed_same_library(self):
+        sizes = scale(300)
+        users = generate(**sizes, seed=7, today=self.today)
+        first = self.snapshot()
+        self.assertEqual((Book.objects.count(), Member.objects.count(), Staff.objects.count(),
+                          BorrowRecord.objects.count()),
+                         (sizes['books'], sizes['members'], sizes['staff'], sizes['loans']))
+        self.assertEqual(stats.reconcile(self.today)[1], {})
+        self.assertTrue(self.client.login(username=users['member'], password=PASSWORD))
+
+        for model in (BorrowRecord, Book, User):
+            model.objects.all().delete()
+        generate(**sizes, seed=7, today=self.today)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_every_route_has_a_benchmark_case(self):
+        routes = {pattern.name for pattern in get_resolver('library_management.urls').url_patterns}
+        self.assertLessEqual(routes, {case.route for case in CASES})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class MetricsTests(TestCase):
+    def test_requests_are_measured_per_view(self):
+        labels = (('view', 'my_books'),)
+        make_member('member')
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+        def totals():
+            counters, histograms = registry.collect()
+            queries = histograms['library_db_queries_per_request'].get(labels, [[0], 0])
+            return (counters['library_requests_total'].get(labels + (('method', 'GET'), ('status', '200')), 0),
+                    sum(queries[0]), queries[1], counters['library_template_render_seconds_total'].get(labels, 0))
+        requests, observed, queries, template_time = totals()
+        self.client.get('/my_books/')
+        after = totals()
+        self.assertEqual(after[:2], (requests + 1, observed + 1))
+        self.assertGreater(after[2], queries)
+        self.assertGreater(after[3], template_time)
+
+    def test_endpoint_is_staff_only(self):
+        make_member('member')
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE library_requests_total counter', response.content)
+
+    def test_export_is_cumulative(self):
+        metrics = Registry()
+        request_metrics = RequestMetrics()
+        request_metrics.queries = 3
+        metrics.record('home', 'GET', 200, 0.02, 2000, request_metrics)
+        metrics.record('home', 'GET', 200, 0.2, 2000, request_metrics)
+        lines = metrics.export().splitlines()
+        self.assertIn('library_requests_total{view="home",method="GET",status="200"} 2', lines)
+        self.assertIn('library_request_duration_seconds_bucket{view="home",le="0.025"} 1', lines)
+        self.assertIn('library_request_duration_seconds_bucket{view="home",le="+Inf"} 2', lines)
+        self.assertIn('library_db_queries_per_request_sum{view="home"} 6', lines)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncViewTests(TransactionTestCase):
+    # A TransactionTestCase, since the async views run their queries in
+    # another thread that would block on the test transaction
+
+    def setUp(self):
+        member = make_member('member')
+        for i in range(3):
+            make_book(f'Book {i}')
+        checkout(Book.objects.get(Title='Book 0').id, member, today=date.today() - timedelta(days=30))
+        checkin(Book.objects.get(Title='Book 0').id, member, today=date.today() - timedelta(days=10))
+        checkout(Book.objects.get(Title='Book 1').id, member)
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+        self.async_client.cookies = self.client.cookies
+
+    def test_asgi_routes_use_the_async_views(self):
+        self.assertIs(get_resolver('library_system.asgi_urls').resolve('/available_books/').func,
+                      async_available_books)
+
+    async def test_async_pages_match_the_sync_pages(self):
+        for url in ['/home/', '/available_books/', '/my_books/', '/history/']:
+            with self.subTest(url=url):
+                sync_response = await sync_to_async(self.client.get)(url)
+                with override_settings(ROOT_URLCONF='library_system.asgi_urls'):
+                    async_response = await self.async_client.get(url)
+                    # resolver_match is resolved lazily, against the current URLconf
+                    self.assertTrue(iscoroutinefunction(async_response.resolver_match.func))
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(async_response.content, sync_response.content)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ExportLoansTests(TestCase):
+    def setUp(self):
+        self.member = make_member('member')
+        today = date.today()
+        books = [make_book(f'Book {i}', Genre='history' if i == 2 else 'fiction') for i in range(3)]
+        # One returned loan old enough to be archived, one overdue, one open
+        for book, days_ago, returned in [(books[0], 900, True), (books[1], 30, False), (books[2], 3, False)]:
+            borrowed = today - timedelta(days=days_ago)
+            BorrowRecord.objects.create(book=book, borrower=self.member, borrow_date=borrowed,
+                                        due_date=borrowed + timedelta(days=14),
+                                        return_date=borrowed + timedelta(days=10) if returned else None,
+                                        is_returned=returned,
+                                        borrow_duration=timedelta(days=10) if returned else None)
+        call_command('archive_loans', days=365, stdout=io.StringIO())
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+
+    def export(self, **params):
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        response = self.client.get('/export_loans/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_includes_archived_loans(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['title'] for row in rows], ['Book 0', 'Book 1', 'Book 2'])
+        self.assertEqual(rows[0]['borrow_duration_days'], '10')
+        self.assertEqual(rows[0]['username'], 'member')
+        self.assertEqual(ArchivedBorrowRecord.objects.count(), 1)
+
+    def test_jsonl_filters(self):
+        response, body = self.export(format='jsonl', state='overdue')
+        self.assertTrue(response['Content-Disposition'].endswith('.jsonl"'))
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['Book 1'])
+        _, body = self.export(format='jsonl', genre='history', state='bogus')
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['Book 2'])
+
+    def test_members_cannot_export(self):
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+        self.assertEqual(self.client.get('/export_loans/').status_code, 302)
+
+    def test_command_matches_view(self):
+        out = io.StringIO()
+        call_command('export_loans', state='returned', stdout=out)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0][0], 'loan_id')
+        self.assertEqual([row[9] for row in rows[1:]], ['Book 0'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SessionTests(TestCase):
+    def setUp(self):
+        make_member('member')
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+    def test_page_views_do_not_touch_the_session_table(self):
+        self.client.get('/my_books/')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/my_books/').status_code, 200)
+            self.assertEqual(self.client.get('/history/').status_code, 200)
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'django_session' in q['sql']])
+        self.assertNotIn('user_id', self.client.session)
+        self.assertNotIn('is_logged_in', self.client.session)
+
+    def test_password_change_keeps_the_session(self):
+        response = self.client.post(reverse('forget_password'), {'current_pass': 'pass', 'new_pass': 'new',
+                                                          'confirm_pass': 'new'})
+        self.assertRedirects(response, '/home/', fetch_redirect_response=False)
+        self.assertEqual(self.client.get('/my_books/').status_code, 200)
+
+    def test_logout(self):
+        self.client.get('/logout/')
+        self.assertEqual(self.client.get('/my_books/').status_code, 302)
+
+
+class PurgeSessionsTests(TestCase):
+    def test_only_expired_sessions_are_deleted(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'old{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        out = io.StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=out)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BookCardCacheTests(TestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        self.book = make_book('Old Title')
+        make_member('member')
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+    def test_cards_are_cached_until_the_book_changes(self):
+        self.assertContains(self.client.get('/available_books/'), 'Old Title')
+        # Not through save(), so Updated_on stays and the cached card is served
+        Book.objects.filter(pk=self.book.pk).update(Author='Someone Else')
+        self.assertNotContains(self.client.get('/available_books/'), 'Someone Else')
+
+        self.book.refresh_from_db()
+        self.book.Title = 'New Title'
+        self.book.save()
+        response = self.client.get('/available_books/')
+        self.assertContains(response, 'New Title')
+        self.assertContains(response, 'Someone Else')
+        self.assertNotContains(response, 'Old Title')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.member = make_member('member')
+        self.books = [make_book(f'Book {i}') for i in range(3)]
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in ['/available_books/', '/history/']:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as full:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('no-cache', response['Cache-Control'])
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.revalidate(url, response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                # Answered from the state aggregates, before the view's own queries
+                self.assertLess(len(queries), len(full))
+                self.assertIn('MAX(', queries[-1]['sql'])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+    def test_catalog_state_does_not_scan(self):
+        with CaptureQueriesContext(connection) as queries:
+            books_state(None)
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[-1] for row in cursor.fetchall()]
+                self.assertFalse([step for step in plan if step.startswith('SCAN')], query['sql'])
+
+    def test_changes_invalidate_the_etag(self):
+        history = self.client.get('/history/')['ETag']
+        books = self.client.get('/available_books/')['ETag']
+        checkout(self.books[0].id, self.member)
+        self.assertEqual(self.revalidate('/history/', history).status_code, 200)
+        self.assertEqual(self.revalidate('/available_books/', books).status_code, 200)
+
+        books = self.client.get('/available_books/')['ETag']
+        # A delete does not move MAX(Updated_on), the count catches it
+        Book.objects.filter(pk=self.books[2].pk).delete()
+        self.assertEqual(self.revalidate('/available_books/', books).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get('/history/')['ETag']
+        make_member('other')
+        self.client.post('/login/', {'username': 'other', 'loginpwd': 'pass'})
+        self.assertEqual(self.revalidate('/history/', etag).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ApiTests(TestCase):
+    def setUp(self):
+        self.member = make_member('member')
+        self.books = [make_book(f'Book {i}') for i in range(5)]
+        self.client.post('/login/', {'username': 'member', 'loginpwd': 'pass'})
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        return response.status_code, response.json()
+
+    def test_books_pages_and_fields(self):
+        ids, cursor = [], None
+        while True:
+            params = {'fields': 'Title', 'limit': 2, **({'cursor': cursor} if cursor else {})}
+            status, data = self.get('/api/v1/books/', **params)
+            self.assertEqual(status, 200)
+            self.assertTrue(all(set(item) == {'id', 'Title'} for item in data['items']))
+            ids += [item['id'] for item in data['items']]
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(ids, [book.id for book in reversed(self.books)])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get('/api/v1/books/', fields='Title,password'),
+                         (400, {'error': 'Unknown field: password'}))
+        self.assertEqual(self.get('/api/v1/books/', limit=0)[0], 400)
+        self.assertEqual(self.get('/api/v1/books/', cursor='nonsense'), (400, {'error': 'Invalid cursor.'}))
+        self.assertEqual(self.client.post('/api/v1/books/').status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.get('/api/v1/books/')[0], 401)
+
+    def test_loans_include_archived_and_live_fines(self):
+        today = date.today()
+        old = today - timedelta(days=900)
+        BorrowRecord.objects.create(book=self.books[0], borrower=self.member, borrow_date=old,
+                                    due_date=old + timedelta(days=14), return_date=old + timedelta(days=5),
+                                    is_returned=True, borrow_duration=timedelta(days=5))
+        call_command('archive_loans', days=365, stdout=io.StringIO())
+        checkout(self.books[1].id, self.member, today=today - timedelta(days=30))
+
+        status, data = self.get('/api/v1/loans/', fields='title,fine,is_overdue')
+        self.assertEqual(status, 200)
+        overdue, archived = data['items']
+        self.assertEqual(archived['title'], 'Book 0')
+        self.assertEqual(overdue['title'], 'Book 1')
+        due_date = BorrowRecord.objects.get(book=self.books[1]).due_date
+        self.assertEqual(overdue['fine'], compute_fine(due_date, today))
+        self.assertTrue(overdue['is_overdue'])
+
+        for state, title in [('open', 'Book 1'), ('returned', 'Book 0')]:
+            _, data = self.get('/api/v1/loans/', fields='title', state=state)
+            self.assertEqual([item['title'] for item in data['items']], [title])
+
+    def test_loans_are_for_members_only(self):
+        Staff.objects.create(user=User.objects.create_user('staff', password='pass'),
+                             gender='Female', date_of_birth=date(1990, 1, 1))
+        self.client.post('/login/', {'username': 'staff', 'loginpwd': 'pass'})
+        self.assertEqual(self.get('/api/v1/loans/')[0], 403)
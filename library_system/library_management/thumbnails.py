@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+# Book covers are uploaded at full size, the pages only ever show them as
+# small cards. Every cover gets fixed-size WebP and JPEG variants stored as
+# media/thumbs/<hash>-<size>.<ext>. The hash is taken over the file contents,
+# so a changed cover gets new URLs (no stale browser caches) and the same
+# cover uploaded twice shares its thumbnails. Book.Image_hash holds the hash.
+
+THUMB_DIR = 'thumbs'
+
+# 2x the largest box each size is shown in, portrait 2:3-ish like the cards
+SIZES = {
+    'cover': (400, 600),  # catalog and homepage cards
+    'thumb': (200, 280),  # list rows and tables
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def thumbnail_name(image_hash, size, fmt):
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{THUMB_DIR}/{image_hash}-{size}.{ext}'
+
+
+def make_thumbnails(path, media_root=None):
+    """Write every size/format variant of the image at `path` and return its
+    content hash. Variants that already exist are left alone.
+
+    Only touches the filesystem, so it can run in a worker process.
+    """
+    media_root = media_root or settings.MEDIA_ROOT
+    image_hash = content_hash(path)
+    targets = {(size, fmt): os.path.join(media_root, thumbnail_name(image_hash, size, fmt))
+               for size in SIZES for fmt in FORMATS}
+    if all(os.path.exists(target) for target in targets.values()):
+        return image_hash
+
+    os.makedirs(os.path.join(media_root, THUMB_DIR), exist_ok=True)
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        for size, box in SIZES.items():
+            resized = ImageOps.fit(original, box, Image.Resampling.LANCZOS)
+            for fmt, (pil_format, options) in FORMATS.items():
+                target = targets[size, fmt]
+                # Write to a temporary name first so a crash never leaves a
+                # half-written thumbnail behind under its final name
+                tmp = f'{target}.{os.getpid()}.tmp'
+                resized.save(tmp, pil_format, **options)
+                os.replace(tmp, target)
+    return image_hash
+
+
+def thumbnail_url(book, size, fmt):
+    if not book.Image_hash:
+        return ''
+    return settings.MEDIA_URL + thumbnail_name(book.Image_hash, size, fmt)
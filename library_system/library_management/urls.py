@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.index, name='index' ),
@@ -31,9 +31,11 @@ urlpatterns = [
     # Members Operations URLs
     path('home/',views.user,name='user'),
     path('available_books/',views.available_books,name='available_books'),
+    path('search/',views.search,name='search'),
     path('my_books/',views.borrowed_books,name='my_books'),
     path('history/',views.member_history,name='member_history'),
     path('fines/',views.member_fine,name='fines'),
+    path('reservations/',views.reservations,name='reservations'),
 
     # Staff Operations URLs
     path('staff_dashboard/',views.staff_dashboard,name='staff_dashboard'),
@@ -41,10 +43,18 @@ urlpatterns = [
     path('manage_books/',views.manage_books,name='manage_books'),
     path('manage_members/',views.manage_members,name='manage_members'),
     path('settings/',views.settings,name='settings'),
+    path('metrics/',views.metrics,name='metrics'),
+    path('export_loans/',views.export_loans,name='export_loans'),
+
+    # Read-only JSON API for kiosks and the mobile app
+    path('api/v1/books/',api.books,name='api_books'),
+    path('api/v1/loans/',api.my_loans,name='api_loans'),
     
     # URLs carrying unique IDs
     path('borrow_book/<int:book_id>',views.borrow_book,name='borrow_book'),
     path('return_book/<int:book_id>',views.return_book,name='return_book'),
+    path('reserve_book/<int:book_id>',views.reserve_book,name='reserve_book'),
+    path('cancel_reservation/<int:hold_id>',views.cancel_reservation,name='cancel_reservation'),
     path('edit_book/<int:book_id>',views.edit_book,name='edit_book'),
     path('delete_book/<int:book_id>',views.delete_book,name='delete_book'),
     path('edit_member/<int:member_id>',views.edit_member_data,name='edit_member')
@@ -1,12 +1,29 @@
 from django.shortcuts import render,redirect,HttpResponse
+from django.http import StreamingHttpResponse
 from django.contrib.auth.models import User
-from django.contrib.auth import login,logout,authenticate
+from django.contrib.auth import login,logout,authenticate,update_session_auth_hash
 from django.contrib import messages
-from .models import Staff,Member,Book,BorrowRecord
-from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.db.models import Count,OuterRef,Subquery
+from django.db.models.functions import Coalesce
+from .models import Staff,Member,Book,BorrowRecord,Hold
+from .profiles import login_required,staff_required,member_required,remember_profile
+from .pagination import paginate,InvalidCursor
+from .archive import history_page,all_loans
+from .catalog import catalog_context
+from .conditional import conditional,books_state,loans_state
+from .search import search_books
+from .fines import compute_fine
+from . import stats as library_stats
+from .metrics import registry
+from .exports import FORMATS as EXPORT_FORMATS,parse_export_filters,export_queryset,stream as stream_export
+from .circulation import checkout,checkin,place_hold,cancel_hold,add_copies,withdraw_copies,BookUnavailable,BookAvailable,LoanNotFound,AlreadyOnHold,AlreadyBorrowed,HoldNotFound,NotEnoughCopies,CirculationBusy
+from datetime import date, datetime
 
 # Create your views here.
 
+MEMBERS_PER_PAGE = 24
+
 def index(request):
     return render(request, 'index.html')
 
@@ -17,30 +34,29 @@ def user_login(request):
         user = authenticate(request,username=username,password=password)
         if user is not None:
             login(request,user)
-            request.session['user_id'] = user.id
-            request.session['is_logged_in'] = True
             
-            if Staff.objects.filter(user=user).exists():
-                staff = Staff.objects.get(user=user)
+            staff = Staff.objects.filter(user=user).first()
+            if staff is not None:
                 staff.login_time = datetime.now()
-                staff.save()
+                staff.save(update_fields=['login_time'])
+                remember_profile(request, staff)
                 return redirect('/staff_dashboard/')
             else:
+                remember_profile(request, Member.objects.filter(user=user).first())
                 return redirect('/home/')
         else:
             return render(request, 'login.html',{'mes':'Wrong password'})
-    elif request.session.get('is_logged_in'):
+    elif request.user.is_authenticated:
         return redirect('/home/')
     else:
         return render(request,'login.html')
 
 def logout_user(request):
     logout(request)
-    request.session.flush()
     return redirect('/login/')
 
 def signup(request):
-    if request.session.get('is_logged_in'):
+    if request.user.is_authenticated:
         return redirect('/home/')
     else:
         return render(request, 'signup.html')
@@ -81,47 +97,35 @@ def add_user(request):
 
         return redirect('/login/')
 
+@login_required
 def user(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
+    if request.role == 'staff':
+        return redirect('/staff_dashboard/')
+    
+    context = {
+        'user': request.profile.user if request.profile else request.user,
+        'borrowed_books_count': 0,
+        'returned_books_count': 0,
+        'total_fines': 0,
+        'recent_books': []
+    }
+    
+    if request.role == 'member':
+        member = request.profile
         
-        if Staff.objects.filter(user=user).exists():
-            return redirect('/staff_dashboard/')
+        stats = member.loan_stats()
         
-        context = {
-            'user': user,
-            'borrowed_books_count': 0,
-            'returned_books_count': 0,
-            'total_fines': 0,
-            'recent_books': []
-        }
+        context['borrowed_books_count'] = stats['open']
+        context['returned_books_count'] = stats['returned']
+        context['total_fines'] = stats['total_fines']
         
-        try:
-            member = Member.objects.get(user=user)
-            
-            borrowed_records = BorrowRecord.objects.filter(borrower=member)
-            
-            context['borrowed_books_count'] = borrowed_records.filter(return_date__isnull=True).count()
-            
-            context['returned_books_count'] = borrowed_records.filter(return_date__isnull=False).count()
-            
-            total_fines = 0
-            for record in borrowed_records:
-                total_fines += record.fine
-            context['total_fines'] = total_fines
-            
-            context['recent_books'] = Book.objects.order_by('-Added_on')[:4]
-            
-        except Member.DoesNotExist:
-            pass
-            
-        return render(request, 'homepage.html', context)
-    else:
-        return redirect('/login/')
+        context['recent_books'] = Book.objects.order_by('-Added_on')[:4]
+        
+    return render(request, 'homepage.html', context)
 
 def password_reset(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
+    if request.user.is_authenticated:
+        user = request.user
         if request.method == 'POST':
             current = request.POST['current_pass']
             new = request.POST['new_pass']
@@ -130,6 +134,8 @@ def password_reset(request):
                 if new == confirm:
                     user.set_password(new)
                     user.save()
+                    # Keep this session valid now that the password hash changed
+                    update_session_auth_hash(request, user)
                     messages.success(request, 'Password changed successfully.')
                     return redirect('/home/')
                 else:
@@ -144,370 +150,358 @@ def password_reset(request):
         return redirect('/login/')
 
 
-
+@staff_required
 def staff_dashboard(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        if not Staff.objects.filter(user=user).exists():
-            messages.error(request, 'Access denied. Staff only area.')
-            return redirect('/home/')
-            
-        total_books = Book.objects.count()
-        total_members = Member.objects.count()
-        active_loans = BorrowRecord.objects.filter(return_date__isnull=True).count()
-        
-        today = date.today()
-        overdue_books = BorrowRecord.objects.filter(return_date__isnull=True, due_date__lt=today).count()
-        
-        context = {
-            'total_books': total_books,
-            'total_members': total_members,
-            'active_loans': active_loans,
-            'overdue_books': overdue_books,
-        }
-        return render(request, 'staff_dashboard.html', context)
-    else:
-        return redirect('/login/')
-
+    stats = library_stats.current()
+    
+    context = {
+        'total_books': stats.total_books,
+        'total_members': stats.total_members,
+        'active_loans': stats.active_loans,
+        'overdue_books': stats.overdue_loans,
+    }
+    return render(request, 'staff_dashboard.html', context)
+
+@staff_required
 def manage_books(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        if not Staff.objects.filter(user=user).exists():
-            return redirect('/home/')
-            
-        books = Book.objects.all().order_by('-Added_on')
-        return render(request, 'manage_books.html', {'books': books})
-    else:
-        return redirect('/login/')
+    try:
+        context = catalog_context(Book.objects.all(), request.GET)
+    except InvalidCursor:
+        return redirect('/manage_books/')
+    return render(request, 'manage_books.html', context)
 
+@staff_required
 def add_book(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        if not Staff.objects.filter(user=user).exists():
-            return redirect('/home/')
-            
-        if request.method == 'POST':
-            try:
-                title = request.POST['title']
-                author = request.POST['author']
-                isbn = request.POST['isbn']
-                published_date_str = request.POST['published_date']
-                published_date = datetime.strptime(published_date_str, '%Y-%m-%d').date()
-                genre = request.POST['genre']
-                price = request.POST['price']
-                pages = request.POST['pages']
-                image = request.FILES.get('image')
-                
-                book = Book.objects.create(Title=title, Author=author, ISBN=isbn,
-                                        Published_date=published_date, Genre=genre,
-                                        Price=price, Pages=pages, Image=image)
-                book.save()
-                messages.success(request, f'Book "{title}" added successfully.')
-                return redirect('/staff_dashboard/')
-            except Exception as e:
-                messages.error(request, f'Error adding book: {str(e)}')
-                return render(request, 'add_book.html')
-        else:
+    if request.method == 'POST':
+        try:
+            title = request.POST['title']
+            author = request.POST['author']
+            isbn = request.POST['isbn']
+            published_date_str = request.POST['published_date']
+            published_date = datetime.strptime(published_date_str, '%Y-%m-%d').date()
+            genre = request.POST['genre']
+            price = request.POST['price']
+            pages = request.POST['pages']
+            copies = max(int(request.POST.get('copies') or 1), 1)
+            image = request.FILES.get('image')
+            
+            # The copies are created by a post_save signal; both or neither
+            with transaction.atomic():
+                Book.objects.create(Title=title, Author=author, ISBN=isbn,
+                                    Published_date=published_date, Genre=genre,
+                                    Price=price, Pages=pages, Image=image,
+                                    copies_total=copies, copies_available=copies)
+            messages.success(request, f'Book "{title}" added successfully.')
+            return redirect('/staff_dashboard/')
+        except Exception as e:
+            messages.error(request, f'Error adding book: {str(e)}')
             return render(request, 'add_book.html')
     else:
-        return redirect('/login/')
+        return render(request, 'add_book.html')
 
+@staff_required
 def edit_book(request, book_id):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        if not Staff.objects.filter(user=user).exists():
-            return redirect('/home/')
-            
-        try:
-            book = Book.objects.get(id=book_id)
-            if request.method == 'POST':
-                book.Title = request.POST['title']
-                book.Author = request.POST['author']
-                book.ISBN = request.POST['isbn']
-                published_date_str = request.POST['published_date']
-                book.Published_date = datetime.strptime(published_date_str, '%Y-%m-%d').date()
-                book.Genre = request.POST['genre']
-                book.Price = request.POST['price']
-                book.Pages = request.POST['pages']
-                
-                if 'image' in request.FILES:
-                    book.Image = request.FILES['image']
-                
-                book.save()
-                messages.success(request, f'Book "{book.Title}" updated successfully.')
-                return redirect('/staff_dashboard/')
-            else:
+    try:
+        book = Book.objects.get(id=book_id)
+        if request.method == 'POST':
+            try:
+                copies = int(request.POST['copies']) if request.POST.get('copies') else None
+            except ValueError:
+                messages.error(request, 'Number of copies must be a whole number.')
                 return render(request, 'edit_book.html', {'book': book})
-        except Book.DoesNotExist:
-            messages.error(request, 'Book not found.')
+            book.Title = request.POST['title']
+            book.Author = request.POST['author']
+            book.ISBN = request.POST['isbn']
+            published_date_str = request.POST['published_date']
+            book.Published_date = datetime.strptime(published_date_str, '%Y-%m-%d').date()
+            book.Genre = request.POST['genre']
+            book.Price = request.POST['price']
+            book.Pages = request.POST['pages']
+            # The counters and Status belong to circulation, saving the copies
+            # read above could undo a loan or return made in the meantime
+            fields = ['Title', 'Author', 'ISBN', 'Published_date', 'Genre', 'Price', 'Pages', 'Updated_on']
+            
+            if 'image' in request.FILES:
+                book.Image = request.FILES['image']
+                fields.append('Image')
+            
+            book.save(update_fields=fields)
+
+            if copies is not None:
+                # Compared with the current count, copies may have been added
+                # or withdrawn since the form was loaded
+                book.refresh_from_db(fields=['copies_total'])
+                copies = max(copies, 1)
+                try:
+                    if copies > book.copies_total:
+                        add_copies(book, copies - book.copies_total)
+                    elif copies < book.copies_total:
+                        withdraw_copies(book, book.copies_total - copies)
+                except NotEnoughCopies:
+                    messages.error(request, f'Details of "{book.Title}" saved, but only copies on the shelf '
+                                            'can be withdrawn. The number of copies was not changed.')
+                    return redirect('/staff_dashboard/')
+                except CirculationBusy:
+                    messages.error(request, f'Details of "{book.Title}" saved, but the library is busy right '
+                                            'now. The number of copies was not changed.')
+                    return redirect('/staff_dashboard/')
+            messages.success(request, f'Book "{book.Title}" updated successfully.')
             return redirect('/staff_dashboard/')
-    else:
-        return redirect('/login/')
+        else:
+            return render(request, 'edit_book.html', {'book': book})
+    except Book.DoesNotExist:
+        messages.error(request, 'Book not found.')
+        return redirect('/staff_dashboard/')
 
+@staff_required
 def delete_book(request, book_id):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        if not Staff.objects.filter(user=user).exists():
-            return redirect('/home/')
-            
-        try:
-            book = Book.objects.get(id=book_id)
-            title = book.Title
-            book.delete()
-            messages.success(request, f'Book "{title}" deleted successfully.')
-        except Book.DoesNotExist:
-            messages.error(request, 'Book not found.')
-            
-        return redirect('/staff_dashboard/')
-    else:
-        return redirect('/login/')
+    try:
+        book = Book.objects.get(id=book_id)
+        title = book.Title
+        book.delete()
+        messages.success(request, f'Book "{title}" deleted successfully.')
+    except Book.DoesNotExist:
+        messages.error(request, 'Book not found.')
+        
+    return redirect('/staff_dashboard/')
 
+@login_required
+@conditional(books_state)
 def available_books(request):
-    if request.session.get('is_logged_in'):
-        books = Book.objects.filter(Status='available')
-        return render(request, 'available_books.html', {'books': books})
-    else:
-        return redirect('/login/')
-
-
+    try:
+        context = catalog_context(Book.objects.filter(Status='available'), request.GET)
+    except InvalidCursor:
+        return redirect('/available_books/')
+    return render(request, 'available_books.html', context)
+
+@login_required
+def search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    books, has_next = search_books(query, page) if query else ([], False)
+    context = {
+        'query': query,
+        'books': books,
+        'page': page,
+        'has_next': has_next,
+        'base_template': 'staff_base.html' if request.role == 'staff' else 'member_base.html',
+    }
+    return render(request, 'search_results.html', context)
+
+
+@member_required
 def borrow_book(request, book_id):
-    if request.session.get('is_logged_in'):
-        try:
-            book = Book.objects.get(id=book_id)
-            
-            if book.Status != 'available':
-                messages.error(request, 'This book is currently unavailable.')
-                return redirect('/available_books/')
-            
-            user = User.objects.get(id=request.session['user_id'])
-            try:
-                member = Member.objects.get(user=user)
-            except Member.DoesNotExist:
-                messages.error(request, 'Member profile not found. Please contact administrator.')
-                return redirect('/available_books/')
-            
-            borrow_date = date.today()
-            due_date = borrow_date + timedelta(days=14)  
-            
-            borrow_record = BorrowRecord.objects.create(
-                book=book, 
-                borrower=member,
-                borrow_date=borrow_date, 
-                due_date=due_date
-            )
-            borrow_record.save()
-            
-            book.Status = 'unavailable'
-            book.save()
-            
-            messages.success(request, f'Successfully borrowed "{book.Title}". Due date: {due_date.strftime("%B %d, %Y")}')
-            return redirect('/available_books/')
-            
-        except Book.DoesNotExist:
-            messages.error(request, 'Book not found.')
-            return redirect('/available_books/')
-    else:
-        return redirect('/login/')
-
-
+    try:
+        borrow_record = checkout(book_id, request.profile)
+        due_date = borrow_record.due_date
+        messages.success(request, f'Successfully borrowed "{borrow_record.book.Title}". Due date: {due_date.strftime("%B %d, %Y")}')
+    except Book.DoesNotExist:
+        messages.error(request, 'Book not found.')
+    except BookUnavailable:
+        messages.error(request, 'This book is currently unavailable.')
+    except AlreadyBorrowed:
+        messages.error(request, 'You already have a copy of this book.')
+    except CirculationBusy:
+        messages.error(request, 'The library is busy right now. Please try again.')
+    return redirect('/available_books/')
+
+@member_required
+@conditional(books_state, loans_state)
 def borrowed_books(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        try:
-            member = Member.objects.get(user=user)
-            
-            all_records = BorrowRecord.objects.filter(borrower=member).order_by('-borrow_date')
-            
-            active_loans = []
-            history = []
-            
-            today = date.today()
-            
-            for record in all_records:
-                if record.return_date is None:
-                    if today > record.due_date:
-                        if record.is_returned == False:
-                            overdue_days = (today - record.due_date).days
-                            record.fine = overdue_days * 10
-                            record.is_overdue = True
-                        else:
-                            record.fine = 0
-                            record.is_overdue = False
-                    active_loans.append(record)
-                else:
-                    history.append(record)
-            
-            average_days = member.average_borrow_days()
-            average_days = round(average_days,1)
-            
-            context = {
-                'active_loans': active_loans,
-                'history': history,
-                'average_days': average_days,
-            }
-
-            return render(request, 'borrowed_books.html', context)
-            
-        except Member.DoesNotExist:
-            messages.error(request, 'Member profile not found.')
-            return redirect('/home/')
-    else:
-        return redirect('/login/')
-
+    member = request.profile
+    
+    all_records = BorrowRecord.objects.filter(borrower=member).select_related('book').order_by('-borrow_date')
+    
+    active_loans = []
+    history = []
+    
+    today = date.today()
+    
+    for record in all_records:
+        if record.return_date is None:
+            # Stored values are refreshed by `manage.py update_overdue`; compute
+            # today's figure here so the page is exact between runs.
+            record.fine = compute_fine(record.due_date, today)
+            record.is_overdue = record.fine > 0
+            active_loans.append(record)
+        else:
+            history.append(record)
+    
+    stats = member.loan_stats()
+    
+    context = {
+        'active_loans': active_loans,
+        # Recent returns; older ones are archived and listed on /history/
+        'history': history,
+        'returned_count': stats['returned'],
+        'average_days': round(stats['average_days'],1),
+    }
+
+    return render(request, 'borrowed_books.html', context)
+
+@member_required
+@conditional(books_state, loans_state)
 def member_history(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        history = []
-        try:
-            member = Member.objects.get(user=user)
-            
-            all_records = BorrowRecord.objects.filter(borrower=member).order_by('-borrow_date')
-            
-            total_fines = 0
-            returned_count = 0
-            for record in all_records:
-                history.append(record)
-                if record.fine > 0:
-                    total_fines += record.fine
-                if record.return_date:
-                    returned_count += 1
-            
-            context = {
-                'history': history,
-                'total_fines': total_fines,
-                'returned_count': returned_count
-            }
-            
-            return render(request, 'member_history.html', context)
-            
-        except Member.DoesNotExist:
-            messages.error(request, 'Member profile not found.')
-            return redirect('/home/')
-    else:
-        return redirect('/login/')
+    member = request.profile
+    try:
+        history = history_page(member, request.GET.get('cursor'))
+    except InvalidCursor:
+        return redirect('/history/')
+    stats = member.loan_stats()
+    
+    context = {
+        'history': history,
+        'page': history,
+        'total_records': stats['open'] + stats['returned'],
+        'total_fines': stats['total_fines'],
+        'returned_count': stats['returned']
+    }
+    
+    return render(request, 'member_history.html', context)
 
+@member_required
 def member_fine(request):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id=request.session['user_id'])
-        fines = []
-        total_fines = 0
+    member = request.profile
+    fines = all_loans(member, ['borrow_date', 'id'], fine__gt=0)
+    stats = member.loan_stats()
         
-        try:
-            member= Member.objects.get(user=user)
-
-            all_records = BorrowRecord.objects.filter(borrower=member).order_by('borrow_date')
-            for record in all_records:
-                if record.fine > 0:
-                    total_fines += record.fine
-                    fines.append(record)
-                
-            context = {
-                'fines':fines,
-                'total_fines': total_fines,
-                'total_books':len(fines)
-            }
-
-            return render(request, 'members_fines.html',context)
-
-        except Member.DoesNotExit:
-            messages.error(request, 'Member profile not found')
-            return redirect('/home/')
-    else:
-        return redirect('/login/')
+    context = {
+        'fines':fines,
+        'total_fines': stats['total_fines'],
+        'total_books':stats['fined']
+    }
 
-def return_book(request, book_id):
-    if request.session.get('is_logged_in'):
-        try:
-            book = Book.objects.get(id=book_id)
-            user = User.objects.get(id=request.session['user_id'])
-            member = Member.objects.get(user=user)
-            
-            borrow_record = BorrowRecord.objects.get(book=book, borrower=member,is_returned=False)
-            
-            today = date.today()
-            if today > borrow_record.due_date:
-                overdue_days = (today - borrow_record.due_date).days
-                fine_amount = overdue_days * 10
-                borrow_record.fine = fine_amount
-            
-            borrow_record.return_date = today
-            borrow_record.is_returned = True
-            borrow_record.borrow_duration = borrow_record.return_date - borrow_record.borrow_date
-            borrow_record.save()
-            
-            book.Status = 'available'
-            book.save()
-            
-            messages.success(request, f'Successfully returned "{book.Title}".')
-            if borrow_record.fine > 0:
-                messages.warning(request, f'Book returned with a fine of PKR {borrow_record.fine}.')
-                
-        except (Book.DoesNotExist, Member.DoesNotExist, BorrowRecord.DoesNotExist):
-            messages.error(request, 'Error returning book. Record not found.')
-            
-        return redirect('/my_books/')
-    else:
-        return redirect('/login/')
+    return render(request, 'members_fines.html',context)
 
+@member_required
+def return_book(request, book_id):
+    try:
+        borrow_record = checkin(book_id, request.profile)
+        
+        messages.success(request, f'Successfully returned "{borrow_record.book.Title}".')
+        if borrow_record.fine > 0:
+            messages.warning(request, f'Book returned with a fine of PKR {borrow_record.fine}.')
+            
+    except LoanNotFound:
+        messages.error(request, 'Error returning book. Record not found.')
+    except CirculationBusy:
+        messages.error(request, 'The library is busy right now. Please try again.')
+        
+    return redirect('/my_books/')
+
+@member_required
+def reservations(request):
+    # Members ahead in the queue, a correlated COUNT on hold_queue_idx per hold
+    ahead = (Hold.objects.filter(book_id=OuterRef('book_id'), status='waiting', position__lt=OuterRef('position'))
+             .values('book_id').annotate(n=Count('id')).values('n'))
+    holds = (Hold.objects.filter(member=request.profile, status__in=Hold.ACTIVE)
+             .select_related('book').annotate(ahead=Coalesce(Subquery(ahead), 0)).order_by('placed_on'))
+    return render(request, 'reservations.html', {'holds': holds})
+
+@member_required
+def reserve_book(request, book_id):
+    try:
+        hold = place_hold(book_id, request.profile)
+        messages.success(request, f'You are on the waiting list for "{hold.book.Title}".')
+    except Book.DoesNotExist:
+        messages.error(request, 'Book not found.')
+    except BookAvailable:
+        messages.info(request, 'This book is available, you can borrow it right away.')
+    except AlreadyOnHold:
+        messages.error(request, 'You already have this book or a reservation for it.')
+    except CirculationBusy:
+        messages.error(request, 'The library is busy right now. Please try again.')
+    return redirect('/reservations/')
+
+@member_required
+def cancel_reservation(request, hold_id):
+    try:
+        cancel_hold(hold_id, request.profile)
+        messages.success(request, 'Reservation cancelled.')
+    except HoldNotFound:
+        messages.error(request, 'Reservation not found.')
+    except CirculationBusy:
+        messages.error(request, 'The library is busy right now. Please try again.')
+    return redirect('/reservations/')
+
+@staff_required
+def metrics(request):
+    return HttpResponse(registry.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_required
+def export_loans(request):
+    fmt = request.GET.get('format') if request.GET.get('format') in EXPORT_FORMATS else 'csv'
+    content_type, extension = EXPORT_FORMATS[fmt]
+    loans = export_queryset(parse_export_filters(request.GET))
+    response = StreamingHttpResponse(stream_export(loans, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="loans-{date.today():%Y%m%d}.{extension}"'
+    return response
+
+@staff_required
 def manage_members(request):
-    members = Member.objects.all()
-    blocked = Member.objects.filter(is_blocked = True).count()
-    for member in members:
-        member.borrow_count=BorrowRecord.objects.filter(borrower = member,is_returned=False).count()
+    # A correlated COUNT instead of JOIN + GROUP BY keeps the page query walking
+    # the primary key, so only the rows on this page get counted
+    open_loans = (BorrowRecord.objects.filter(borrower=OuterRef('pk'), is_returned=False)
+                  .values('borrower').annotate(n=Count('id')).values('n'))
+    members = (Member.objects.select_related('user')
+               .annotate(open_loans=Coalesce(Subquery(open_loans), 0)))
+    try:
+        page = paginate(members, ['id'], request.GET.get('cursor'), MEMBERS_PER_PAGE)
+    except InvalidCursor:
+        return redirect('/manage_members/')
+
+    counts = Member.objects.status_counts()
     
-    content = {'members':members,
-               'blocked':blocked,}
+    content = {'members':page,
+               'page':page,
+               'total':sum(counts.values()),
+               'active':counts['Online'] + counts['Away'] + counts['Offline'],
+               'inactive':counts['Inactive'],
+               'blocked':counts['Blocked'],}
     return render(request,'manage_members.html',content)
 
+@staff_required
 def edit_member_data(request,member_id):
-    if request.session.get('is_logged_in'):
-        user = User.objects.get(id = request.session['user_id'])
-        if not Staff.objects.filter(user=user):
-            return redirect('/home/')
+    try:
+        member = Member.objects.select_related('user').get(id=member_id)
+        if request.method == 'POST':
+            member_user = member.user
+            
+            first_name = request.POST['first_name']
+            last_name = request.POST['last_name']
+            email = request.POST['email']
+            username = request.POST['username']
+            gender = request.POST['gender']
+            dob_str = request.POST['dob']
+            dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
+        
+            member_user.first_name = first_name
+            member_user.last_name = last_name
+            member_user.email = email
+            member_user.username = username
+            member.gender = gender
+            member.date_of_birth = dob
+            member.save()
+            member_user.save()
+            messages.success(request,"Member's data changed!")
+            return redirect('/manage_members/')
         else:
-            try:
-                member = Member.objects.get(id=member_id)
-                if request.method == 'POST':
-                    member_user = User.objects.get(username=member.user.username)
-                    
-                    first_name = request.POST['first_name']
-                    last_name = request.POST['last_name']
-                    email = request.POST['email']
-                    username = request.POST['username']
-                    gender = request.POST['gender']
-                    dob_str = request.POST['dob']
-                    dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
-                
-                    member_user.first_name = first_name
-                    member_user.last_name = last_name
-                    member_user.email = email
-                    member_user.username = username
-                    member.gender = gender
-                    member.date_of_birth = dob
-                    member.save()
-                    member_user.save()
-                    messages.success(request,"Member's data changed!")
-                    return redirect('/manage_members/')
-                else:
-                    return render(request,'edit_member.html',{'member':member})
-            except:
-                messages.error(request,"an unexpected Error Occured!")
-                return redirect('/manage_members/')
-    else:
-        return redirect('/login/')
+            return render(request,'edit_member.html',{'member':member})
+    except:
+        messages.error(request,"an unexpected Error Occured!")
+        return redirect('/manage_members/')
     
+@login_required
 def settings(request):
-    if request.session.get('is_logged_in'):
-        logged_in_user = User.objects.get(id=request.session['user_id'])
-        if not Staff.objects.filter(user=logged_in_user): 
-            logged_in  = Member.objects.get(user=logged_in_user)
-            template = 'member_settings.html'
-        else:
-            logged_in = Staff.objects.get(user=logged_in_user)
-            template = 'staff_settings.html'
-        content = {
-            'logged_in':logged_in
-        }
-        return render(request, template, content)
+    if request.role == 'staff':
+        template = 'staff_settings.html'
     else:
-        return redirect('/login/')
\ No newline at end of file
+        template = 'member_settings.html'
+    content = {
+        'logged_in':request.profile
+    }
+    return render(request, template, content)
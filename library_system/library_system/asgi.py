@@ -9,8 +9,28 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_system.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'library_system.asgi_urls'
+
+
+class LibraryASGIHandler(ASGIHandler):
+    # Requests coming in over ASGI resolve against the URLconf with the async
+    # views; WSGI keeps using ROOT_URLCONF and the sync views.
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+
+def get_application():
+    # Same as django.core.asgi.get_asgi_application(), with the handler above
+    django.setup(set_prefix=False)
+    return LibraryASGIHandler()
+
+
+application = get_application()
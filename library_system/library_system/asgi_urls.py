@@ -0,0 +1,20 @@
+"""
+URL configuration used when the site is served through asgi.py.
+
+Same routes as library_system/urls.py, except that the read-heavy pages are
+served by their async versions in library_management/async_views.py.
+"""
+from django.urls import path
+
+from library_management import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+# Listed first, so they win over the sync routes with the same paths
+urlpatterns = [
+    path('home/', async_views.user, name='user'),
+    path('available_books/', async_views.available_books, name='available_books'),
+    path('my_books/', async_views.borrowed_books, name='my_books'),
+    path('history/', async_views.member_history, name='member_history'),
+    path('staff_dashboard/', async_views.staff_dashboard, name='staff_dashboard'),
+] + sync_urlpatterns
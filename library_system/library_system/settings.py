@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library_management.middleware.MetricsMiddleware',
     'library_management.middleware.UpdateLastActivityMiddleware',
 
 ]
@@ -60,9 +61,62 @@ LOGIN_REDIRECT_URL = '/home/'  # or '/dashboard/' or '/home/'
 LOGOUT_REDIRECT_URL = '/login/'
 LOGIN_URL = '/login/'  # Where to redirect if user needs to log in
 
+# Activity tracking (see library_management/activity.py)
+ACTIVITY_GRANULARITY = 60      # seconds before a user's last_activity is written again
+ACTIVITY_FLUSH_INTERVAL = 30   # seconds between write-backs of buffered timestamps
+ACTIVITY_FLUSH_SIZE = 100      # write back early once this many users are buffered
+
+# Loans returned more than this many days ago are moved to the archive table
+# by `manage.py archive_loans` (see library_management/archive.py)
+ARCHIVE_LOANS_AFTER_DAYS = 365
+
+# Session storage. 'cached_db' reads sessions from the cache and writes through
+# to the database, so a request only touches django_session when its session
+# changes or is not cached yet; 'db' always goes to the database. The local
+# memory cache is per process: with several server processes point CACHES at
+# a shared cache (memcached, redis) so they all see the same sessions.
+# Expired rows are removed by `manage.py purge_sessions`.
+SESSION_MODE = 'cached_db'
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}[SESSION_MODE]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'library',
+        # Room for every active session; the default of 300 would push most
+        # of them back to the database
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Rendered book cards ({% cache %} in available_books.html and
+# manage_books.html). The keys include Book.Updated_on, so an edited book
+# never shows a stale card and entries never need to expire; the least
+# recently used ones are evicted when the cache is full. 'file' shares the
+# cards between server processes.
+FRAGMENT_CACHE = 'locmem'
+CACHES['fragments'] = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'library-fragments',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'fragments',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}[FRAGMENT_CACHE]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for the /metrics/ endpoint
+        'BACKEND': 'library_management.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR/ 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,13 +135,36 @@ WSGI_APPLICATION = 'library_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are kept open for CONN_MAX_AGE seconds and checked before a
+# request reuses them (CONN_HEALTH_CHECKS), instead of one per request.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Run on every new SQLite connection (library_management/pragmas.py):
+# - journal_mode WAL: readers keep reading while a write is in progress
+#   instead of waiting for it; the setting is stored in the database file
+# - synchronous NORMAL: no fsync per commit, only at WAL checkpoints. Safe
+#   against application crashes, a power cut can lose the last commits.
+# - busy_timeout: milliseconds a writer waits for the lock before failing
+# - cache_size: page cache per connection, negative values are in KiB (64 MB)
+# - mmap_size: bytes of the file read through memory mapping (256 MB)
+# - temp_store MEMORY: sorts and temp b-trees stay off disk
+# `manage.py bench_sqlite` compares this against SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators